@@ -0,0 +1,121 @@
+# backend/backends.py
+# Inference backends behind model_loader.load_model(). Every backend exposes
+# predict(batch) -> (N, num_classes) float32 scores for a preprocessed batch.
+import os
+import threading
+
+import numpy as np
+
+SAVED_MODEL_DIR = os.path.join(os.path.dirname(__file__), "saved_model")
+KERAS_MODEL_PATH = os.path.join(SAVED_MODEL_DIR, "best_model.h5")
+TFLITE_PATHS = {
+    "tflite-fp16": os.path.join(SAVED_MODEL_DIR, "best_model_fp16.tflite"),
+    "tflite-int8": os.path.join(SAVED_MODEL_DIR, "best_model_int8.tflite"),
+}
+BACKENDS = ("keras",) + tuple(TFLITE_PATHS)
+
+# "keras", "tflite-fp16" or "tflite-int8" (see convert_tflite.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "keras")
+# 0 = library default
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "0"))
+# batch shapes a TFLite model is planned for; other sizes are zero-padded up to the next one
+TFLITE_BATCH_SIZES = sorted({int(n) for n in os.environ.get("TFLITE_BATCH_SIZES", f"1,{os.environ.get('BATCH_MAX_SIZE', '8')}").split(",") if n.strip()})
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path=KERAS_MODEL_PATH, num_threads=INFERENCE_THREADS):
+        import tensorflow as tf
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError:
+                # TF was already initialised in this process; keep its settings
+                pass
+        self.path = path
+        self.model = tf.keras.models.load_model(path)
+
+    def predict(self, batch):
+        # predict_on_batch skips model.predict's per-call data adapter and callbacks
+        return np.asarray(self.model.predict_on_batch(batch), dtype=np.float32)
+
+
+def _tflite_interpreter(path, num_threads):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads or None)
+
+
+class TFLiteBackend:
+    """
+    One interpreter per size in batch_sizes, each resized and allocated once:
+    re-planning the tensor arena on every new batch size costs more than
+    running the padding rows. A batch is padded up to the smallest size that
+    fits it (larger ones go through in chunks of the largest).
+    """
+
+    def __init__(self, path, num_threads=INFERENCE_THREADS, name="tflite", batch_sizes=TFLITE_BATCH_SIZES):
+        if not os.path.exists(path):
+            raise RuntimeError(f"TFLite model not found at {path}; run python -m backend.convert_tflite")
+        self.name = name
+        self.path = path
+        self.num_threads = num_threads
+        self.batch_sizes = sorted({max(1, int(n)) for n in batch_sizes}) or [1]
+        probe = _tflite_interpreter(path, num_threads)
+        self._input = probe.get_input_details()[0]
+        self._output = probe.get_output_details()[0]
+        self._interpreters = {}  # batch size -> (interpreter, padded input buffer, lock)
+        self._lock = threading.Lock()
+
+    def _interpreter(self, size):
+        # an interpreter holds per-call state, so each one is used by one call at a time
+        with self._lock:
+            entry = self._interpreters.get(size)
+            if entry is None:
+                interpreter = _tflite_interpreter(self.path, self.num_threads)
+                shape = [size] + list(self._input["shape"][1:])
+                interpreter.resize_tensor_input(self._input["index"], shape)
+                interpreter.allocate_tensors()
+                entry = self._interpreters[size] = (interpreter, np.zeros(shape, dtype=self._input["dtype"]), threading.Lock())
+            return entry
+
+    @staticmethod
+    def _quantize(x, detail):
+        scale, zero_point = detail["quantization"]
+        info = np.iinfo(detail["dtype"])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(detail["dtype"])
+
+    def _run(self, batch):
+        n = len(batch)
+        size = next(s for s in self.batch_sizes if s >= n)
+        interpreter, x, lock = self._interpreter(size)
+        with lock:
+            x[:n] = batch if self._input["dtype"] == np.float32 else self._quantize(batch, self._input)
+            # rows past n keep whatever the last call left; their outputs are dropped
+            interpreter.set_tensor(self._input["index"], x)
+            interpreter.invoke()
+            y = np.array(interpreter.get_tensor(self._output["index"])[:n])
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            y = (y.astype(np.float32) - zero_point) * scale
+        return np.asarray(y, dtype=np.float32)
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.batch_sizes[-1]
+        if len(batch) <= largest:
+            return self._run(batch)
+        return np.concatenate([self._run(batch[i:i + largest]) for i in range(0, len(batch), largest)])
+
+
+def load_backend(name=INFERENCE_BACKEND, num_threads=INFERENCE_THREADS, keras_path=KERAS_MODEL_PATH):
+    if name == "keras":
+        return KerasBackend(keras_path, num_threads)
+    if name in TFLITE_PATHS:
+        return TFLiteBackend(TFLITE_PATHS[name], num_threads, name=name)
+    raise ValueError(f"Unknown INFERENCE_BACKEND {name!r}; choose one of {BACKENDS}")
@@ -0,0 +1,65 @@
+# backend/backfill_thumbnails.py
+# Generate thumbnails for scans stored before thumbnails existed.
+#   python -m backend.backfill_thumbnails [--batch-size 500] [--workers 4] [--force]
+# Legacy base64 rows are skipped; run python -m backend.migrate_images first.
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.db import SessionLocal
+from backend.crud import Scan
+from backend.blob_store import blob_store
+from backend.thumbnails import thumbnail_store, THUMB_WORKERS
+
+
+def _backfill_one(key, force):
+    if not force and thumbnail_store.exists(key):
+        return "skipped"
+    if not blob_store.exists(key):
+        return "missing"
+    try:
+        thumbnail_store.generate(key, blob_store.get(key))
+        return "generated"
+    except Exception as e:
+        print(f"{key}: {e}")
+        return "failed"
+
+
+def backfill_thumbnails(batch_size=500, workers=THUMB_WORKERS, force=False):
+    # keyset over image_path: each distinct blob is visited once however many scans share it
+    db = SessionLocal()
+    counts = {"generated": 0, "skipped": 0, "missing": 0, "failed": 0}
+    last_key = ""
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while True:
+                keys = [
+                    k for (k,) in db.query(Scan.image_path)
+                    .filter(Scan.image_path.isnot(None), Scan.image_path > last_key)
+                    .distinct()
+                    .order_by(Scan.image_path)
+                    .limit(batch_size)
+                ]
+                if not keys:
+                    break
+                for outcome in pool.map(lambda k: _backfill_one(k, force), keys):
+                    counts[outcome] += 1
+                last_key = keys[-1]
+                print(", ".join(f"{k} {v}" for k, v in counts.items()))
+    finally:
+        db.close()
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate missing scan thumbnails")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--workers", type=int, default=THUMB_WORKERS)
+    ap.add_argument("--force", action="store_true", help="regenerate thumbnails that already exist")
+    args = ap.parse_args()
+
+    counts = backfill_thumbnails(args.batch_size, args.workers, args.force)
+    print("done: " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# backend/batcher.py
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backend.preprocess import preprocess_image
+from backend.predict import predict_batch
+from backend.model_loader import INFERENCE_WORKERS
+from backend import metrics
+
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "10"))
+
+
+class InferenceBatcher:
+    """
+    Collects concurrent requests into one batched model call.
+
+    A batch is dispatched once it holds max_batch_size images or max_wait_ms
+    has passed since its first image arrived. Each caller gets its own row of
+    scores back through a future. Up to `concurrency` batches are in flight at
+    once (one per inference worker process; in-process TF already spreads a
+    single batch across the cores).
+    """
+
+    def __init__(self, predict_fn=predict_batch, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, concurrency=None, on_idle=None):
+        self.predict_fn = predict_fn
+        # called (on the event loop) each time the last outstanding image is answered
+        self.on_idle = on_idle
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency if concurrency is not None else INFERENCE_WORKERS))
+        self._queue = None
+        self._task = None
+        self._slots = None
+        self._inflight = set()
+        self._outstanding = 0  # submitted images not yet answered
+        self._executor = None
+
+    async def start(self):
+        if self._task is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="inference")
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            _, fut, _ = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Inference batcher stopped"))
+        # batches already in the model finish; the threads exit after them
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+    async def submit_array(self, img, record=True):
+        # img is a single preprocessed (224, 224, 3) image; record=False leaves the
+        # request's Server-Timing to the caller (many images for one request)
+        await self.start()
+        fut = asyncio.get_running_loop().create_future()
+        # filled in by _dispatch: time spent queued and the batch's model time
+        timing = {"queued": time.perf_counter()}
+        self._outstanding += 1
+        try:
+            await self._queue.put((img, fut, timing))
+            row = await fut
+        finally:
+            self._outstanding -= 1
+            if not self._outstanding and self.on_idle is not None:
+                self.on_idle()
+        if record:
+            metrics.note("batch_wait", timing["wait"])
+            metrics.note("infer", timing["infer"])
+        return row
+
+    async def submit(self, image_bytes):
+        # decode off the event loop so the collector never waits on PIL; the
+        # copied context lets preprocess_image report into this request's timings
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        img = await loop.run_in_executor(None, functools.partial(ctx.run, preprocess_image, image_bytes))
+        return await self.submit_array(img[0])
+
+    def pending(self):
+        # images waiting for a batch
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def inflight(self):
+        # batches currently in the model
+        return len(self._inflight)
+
+    def idle(self):
+        # nothing queued, collecting or in the model: safe to stop without failing a caller
+        return self._outstanding == 0
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        items = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _dispatch(self, items):
+        loop = asyncio.get_running_loop()
+        try:
+            start = time.perf_counter()
+            for _, _, timing in items:
+                timing["wait"] = start - timing["queued"]
+                metrics.STAGE_SECONDS.observe(timing["wait"], "batch_wait")
+            metrics.BATCH_SIZE.observe(len(items))
+            batch = np.stack([img for img, _, _ in items])
+            try:
+                preds = await loop.run_in_executor(self._executor, self.predict_fn, batch)
+            except Exception as e:
+                for _, fut, _ in items:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            elapsed = time.perf_counter() - start
+            for (_, fut, timing), row in zip(items, preds):
+                timing["infer"] = elapsed
+                if not fut.done():
+                    fut.set_result(row)
+        finally:
+            self._slots.release()
+
+    async def _run(self):
+        while True:
+            # wait for a free inference slot first so requests keep piling into the next batch
+            await self._slots.acquire()
+            try:
+                items = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            # callers that gave up (client disconnect) don't need a slot in the batch
+            items = [item for item in items if not item[1].done()]
+            if not items:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._dispatch(items))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
@@ -0,0 +1,67 @@
+# backend/benchmarks/bench_preprocess.py
+# Compare the original and fast preprocessing paths on phone-sized photos.
+#   python -m backend.benchmarks.bench_preprocess --width 4000 --height 3000 --batch 16
+import io
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from backend.preprocess import preprocess_image, preprocess_batch
+
+
+def synthetic_jpeg(width, height, seed=0, quality=90):
+    # smooth gradients plus noise so the JPEG has realistic entropy
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)), (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 20, size=(height, width, 3)).astype(np.float32)
+    arr = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000, min(times) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Preprocessing micro-benchmark")
+    ap.add_argument("--width", type=int, default=4000)
+    ap.add_argument("--height", type=int, default=3000)
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    images = [synthetic_jpeg(args.width, args.height, seed=i) for i in range(args.batch)]
+    one = images[0]
+    print(f"image: {args.width}x{args.height} JPEG, {len(one) / 1e6:.1f} MB; batch={args.batch}")
+
+    rows = [
+        ("single, original", lambda: preprocess_image(one, fast=False), 1),
+        ("single, fast", lambda: preprocess_image(one, fast=True), 1),
+        ("batch, original (loop)", lambda: np.concatenate([preprocess_image(b, fast=False) for b in images]), args.batch),
+        ("batch, fast (thread pool)", lambda: preprocess_batch(images), args.batch),
+    ]
+    print(f"{'path':<28}{'median ms':>12}{'min ms':>10}{'img/s':>10}")
+    for name, fn, n in rows:
+        med, best = timeit(fn, args.repeat)
+        print(f"{name:<28}{med:>12.1f}{best:>10.1f}{n / (med / 1000):>10.1f}")
+
+    legacy = preprocess_image(one, fast=False)
+    fast = preprocess_image(one, fast=True)
+    print(f"output: original {legacy.dtype} {legacy.nbytes // 1024} KB, fast {fast.dtype} {fast.nbytes // 1024} KB, "
+          f"max abs diff {np.abs(legacy - fast).max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# backend/benchmarks/run.py
+# End-to-end benchmark suite for the prediction, storage and reporting paths.
+# Runs against a throwaway database and blob dir with a synthetic stand-in
+# model, so neither the real weights nor the network are needed.
+#   python -m backend.benchmarks.run --output bench.json
+#   python -m backend.benchmarks.run --compare bench.json [--threshold 0.10]
+#   python -m backend.benchmarks.run --current new.json --compare bench.json
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import shutil
+import resource
+import tempfile
+
+import numpy as np
+
+from backend.benchmarks.bench_preprocess import synthetic_jpeg
+
+SUITES = ("preprocess", "predict", "db", "pdf", "http")
+IMAGE_SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+# metric -> True if higher is worse
+METRICS = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "throughput_per_s": False, "peak_rss_mb": True}
+
+
+def configure_env(workdir):
+    # backend modules read their settings at import time, so this must run before importing them
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["BLOB_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["THUMB_DIR"] = os.path.join(workdir, "thumbnails")
+    os.environ["TTS_CACHE_DIR"] = os.path.join(workdir, "tts")
+    os.environ["TTS_ENGINE"] = "local"
+    os.environ["INFERENCE_WORKERS"] = "0"
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"  # measure inference, not cache hits
+    os.environ.pop("PREDICTION_CACHE_DIR", None)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def summarize(name, latencies, wall, count=None):
+    lat = np.sort(np.asarray(latencies) * 1000)
+    count = count if count is not None else len(lat)
+    return {
+        "name": name,
+        "count": count,
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "mean_ms": round(float(lat.mean()), 3),
+        "throughput_per_s": round(count / wall, 2) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(name, fn, n, warmup=2, items_per_call=1):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, time.perf_counter() - start, count=n * items_per_call)
+
+
+class SyntheticBackend:
+    """Stand-in for the CNN: pools the image to 28x28 and applies a fixed random projection."""
+
+    name = "synthetic"
+
+    def __init__(self, num_classes, seed=0):
+        rng = np.random.default_rng(seed)
+        self.w = rng.standard_normal((28 * 28 * 3, num_classes)).astype(np.float32) * 0.05
+
+    def predict(self, batch):
+        n = len(batch)
+        pooled = np.asarray(batch, dtype=np.float32).reshape(n, 28, 8, 28, 8, 3).mean(axis=(2, 4)).reshape(n, -1)
+        logits = pooled @ self.w
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def install_synthetic_model():
+    from backend import model_loader
+    from backend.model_registry import registry, GENERAL
+    labels = model_loader.load_labels()
+    return registry.install(GENERAL, SyntheticBackend(len(labels)), labels, "synthetic").backend
+
+
+def bench_preprocess(args):
+    from backend.preprocess import preprocess_image, preprocess_batch
+    results = []
+    for w, h in IMAGE_SIZES:
+        img = synthetic_jpeg(w, h)
+        results.append(measure(f"preprocess_image/original/{w}x{h}", lambda: preprocess_image(img, fast=False), args.iterations))
+        results.append(measure(f"preprocess_image/fast/{w}x{h}", lambda: preprocess_image(img, fast=True), args.iterations))
+    batch = [synthetic_jpeg(1920, 1080, seed=i) for i in range(16)]
+    results.append(measure("preprocess_batch/fast/16x1920x1080", lambda: preprocess_batch(batch), max(1, args.iterations // 4), items_per_call=16))
+    return results
+
+
+def bench_predict(args):
+    install_synthetic_model()
+    from backend.predict import single_predict
+    img = synthetic_jpeg(1920, 1080)
+    return [measure("single_predict/1920x1080", lambda: single_predict(img), args.iterations)]
+
+
+def _seed_scans(target):
+    # top the table up to `target` rows with metadata-only scans; ids come from the allocator like real inserts
+    from datetime import datetime, timedelta
+    from backend.db import engine, SessionLocal
+    from backend.crud import Scan, scan_ids
+
+    db = SessionLocal()
+    have = db.query(Scan.id).count()
+    db.close()
+    labels = ["AppleScab", "CornCommonRust", "PotatoEarlyBlight", "TomatoEarlyBlight", "TomatoHealthy"]
+    start = datetime(2024, 1, 1)
+    chunk = 10000
+    for offset in range(have, target, chunk):
+        rows = []
+        for i in range(offset, min(target, offset + chunk)):
+            label = labels[i % len(labels)]
+            rows.append({
+                "id": scan_ids.next(), "timestamp": start + timedelta(seconds=i * 30), "crop": label[:6],
+                "top_label": label, "confidence": (i % 100) / 100, "image_path": f"{i:064x}",
+            })
+        with engine.begin() as conn:
+            conn.execute(Scan.__table__.insert(), rows)
+
+
+def bench_db(args):
+    from backend.db import SessionLocal
+    from backend.crud import create_scan_record, get_recent_scans, list_scans
+
+    image = synthetic_jpeg(640, 480)
+    results = []
+    for size in args.db_rows:
+        t0 = time.perf_counter()
+        _seed_scans(size)
+        print(f"  seeded {size} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        db = SessionLocal()
+        counter = iter(range(10 ** 9))
+        top = {"label": "TomatoEarlyBlight", "confidence": 0.9, "treatment": "bench"}
+        try:
+            # unique bytes per call so every insert also writes a new blob
+            results.append(measure(
+                f"create_scan_record/{size}",
+                lambda: create_scan_record(db, image + str(next(counter)).encode(), "Tomato", top, None, None),
+                args.iterations,
+            ))
+            results.append(measure(f"get_recent_scans/50/{size}", lambda: get_recent_scans(db, limit=50), args.iterations))
+            results.append(measure(f"list_scans/50/{size}", lambda: list_scans(db, limit=50), args.iterations))
+            results.append(measure(f"list_scans/50/label/{size}", lambda: list_scans(db, limit=50, label="AppleScab"), args.iterations))
+        finally:
+            db.close()
+    return results
+
+
+def bench_pdf(args):
+    from backend.db import SessionLocal
+    from backend.crud import create_scan_record
+    from backend.report_generator import render_pdf_report
+
+    db = SessionLocal()
+    try:
+        scan = create_scan_record(db, synthetic_jpeg(1920, 1080), "Tomato", {"label": "TomatoEarlyBlight", "confidence": 0.87}, "12.9,77.5", "bench")
+        return [measure("generate_pdf_report/1920x1080", lambda: render_pdf_report(scan), args.iterations)]
+    finally:
+        db.close()
+
+
+async def _load(client, n, concurrency, request):
+    latencies, errors = [], 0
+    remaining = iter(range(n))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            t0 = time.perf_counter()
+            resp = await request(client)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start, errors
+
+
+async def _bench_http(args):
+    import httpx
+    install_synthetic_model()
+    from backend import main
+    from backend.model_loader import is_ready
+
+    await main.start_batcher()
+    while not is_ready():
+        await asyncio.sleep(0.05)
+    image = synthetic_jpeg(1280, 960)
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            routes = {
+                "predict": lambda c: c.post("/predict", files={"file": ("leaf.jpg", image, "image/jpeg")}),
+                "history": lambda c: c.get("/history", params={"limit": 50}),
+            }
+            for route, request in routes.items():
+                await _load(client, min(20, args.requests), args.concurrency, request)  # warm-up
+                latencies, wall, errors = await _load(client, args.requests, args.concurrency, request)
+                result = summarize(f"http/{route}/c{args.concurrency}", latencies, wall)
+                result["errors"] = errors
+                results.append(result)
+    finally:
+        await main.stop_batcher()
+    return results
+
+
+def bench_http(args):
+    return asyncio.run(_bench_http(args))
+
+
+def compare(current, baseline, threshold):
+    # returns the list of regressions beyond threshold (fractional change)
+    base = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    print(f"{'benchmark':<44}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>9}")
+    for r in current["results"]:
+        b = base.get(r["name"])
+        if b is None:
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            old, new = b.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if higher_is_worse else change < -threshold
+            flag = "  REGRESSION" if worse else ""
+            print(f"{r['name']:<44}{metric:<18}{old:>12.2f}{new:>12.2f}{change * 100:>8.1f}%{flag}")
+            if worse:
+                regressions.append({"name": r["name"], "metric": metric, "baseline": old, "current": new, "change": round(change, 4)})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Crop disease API benchmark suite")
+    ap.add_argument("--only", default=",".join(SUITES), help=f"comma-separated subset of {SUITES}")
+    ap.add_argument("--iterations", type=int, default=30)
+    ap.add_argument("--db-rows", default="10000,100000,1000000")
+    ap.add_argument("--requests", type=int, default=200, help="requests per HTTP route")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--output", help="write results as JSON here")
+    ap.add_argument("--current", help="compare this saved result instead of running the suite")
+    ap.add_argument("--compare", help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="fractional change counted as a regression")
+    ap.add_argument("--keep-workdir", action="store_true", help="leave the throwaway database, blobs and thumbnails on disk")
+    args = ap.parse_args()
+    args.db_rows = sorted(int(n) for n in args.db_rows.split(",") if n.strip())
+
+    if args.current:
+        with open(args.current) as f:
+            report = json.load(f)
+    else:
+        suites = [s.strip() for s in args.only.split(",") if s.strip()]
+        unknown = set(suites) - set(SUITES)
+        if unknown:
+            ap.error(f"unknown suites: {sorted(unknown)}")
+        workdir = tempfile.mkdtemp(prefix="crop-bench-")
+        configure_env(workdir)
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "workdir": workdir,
+            "results": [],
+        }
+        runners = {"preprocess": bench_preprocess, "predict": bench_predict, "db": bench_db, "pdf": bench_pdf, "http": bench_http}
+        try:
+            for suite in suites:
+                print(f"running {suite}...", file=sys.stderr)
+                for result in runners[suite](args):
+                    print(f"  {result['name']:<44} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+                          f"{result['throughput_per_s']:>9.1f}/s", file=sys.stderr)
+                    report["results"].append(result)
+        finally:
+            # thumbnail jobs scheduled by the db suites write into the workdir; let them finish first
+            from backend.thumbnails import thumbnail_store
+            thumbnail_store.close()
+            if not args.keep_workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+                report.pop("workdir")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
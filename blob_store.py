@@ -0,0 +1,69 @@
+# backend/blob_store.py
+import os
+import hashlib
+import threading
+
+BLOB_DIR = os.environ.get("BLOB_DIR", os.path.join(os.path.dirname(__file__), "blobs"))
+
+
+def sniff_media_type(head):
+    # head: the first bytes of a file
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """
+    Content-addressed file store. A blob's key is the sha256 of its bytes and it
+    lives at root/ab/cd/<key>, so identical uploads are stored once.
+    """
+
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, data, key=None):
+        # key may be passed when the caller already hashed the bytes
+        key = key or hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if os.path.exists(path):
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # atomic: readers never see a partial blob, concurrent writers of the same key are harmless
+        os.replace(tmp, path)
+        return key
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def media_type(self, key):
+        with open(self.path(key), "rb") as f:
+            return sniff_media_type(f.read(16))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+blob_store = BlobStore()
@@ -0,0 +1,81 @@
+# backend/convert_tflite.py
+# Export saved_model/best_model.h5 to TFLite (float16 and int8) for INFERENCE_BACKEND.
+#   python -m backend.convert_tflite --calibration-dir samples/ [--num-calibration 200]
+import os
+import random
+import argparse
+
+from backend.backends import KERAS_MODEL_PATH, TFLITE_PATHS
+from backend.preprocess import preprocess_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def iter_image_paths(directory):
+    for dirpath, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def representative_dataset(calibration_dir, limit, seed=0):
+    paths = list(iter_image_paths(calibration_dir))
+    if not paths:
+        raise RuntimeError(f"No calibration images found in {calibration_dir}")
+    random.Random(seed).shuffle(paths)
+
+    def gen():
+        # same preprocessing as serving, so activation ranges match real inputs
+        for path in paths[:limit]:
+            with open(path, "rb") as f:
+                yield [preprocess_image(f.read())]
+    return gen
+
+
+def convert_fp16(model):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def convert_int8(model, calibration_dir, limit):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(calibration_dir, limit)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # int8 weights and activations inside; float32 input/output keeps the serving path unchanged
+    return converter.convert()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export the Keras model to TFLite float16 and int8")
+    ap.add_argument("--model", default=KERAS_MODEL_PATH)
+    ap.add_argument("--calibration-dir", help="sample leaf images for int8 calibration")
+    ap.add_argument("--num-calibration", type=int, default=200)
+    ap.add_argument("--variants", default="fp16,int8")
+    args = ap.parse_args()
+
+    import tensorflow as tf
+    model = tf.keras.models.load_model(args.model)
+    variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+
+    for variant in variants:
+        if variant == "fp16":
+            data = convert_fp16(model)
+        elif variant == "int8":
+            if not args.calibration_dir:
+                ap.error("--calibration-dir is required for the int8 variant")
+            data = convert_int8(model, args.calibration_dir, args.num_calibration)
+        else:
+            ap.error(f"unknown variant {variant!r}")
+        out = TFLITE_PATHS[f"tflite-{variant}"]
+        with open(out, "wb") as f:
+            f.write(data)
+        print(f"{variant}: wrote {out} ({len(data) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
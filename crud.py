@@ -1,9 +1,18 @@
 # backend/crud.py
 import base64
-from sqlalchemy.orm import Session
+import json
+import threading
+from sqlalchemy.orm import Session, deferred
 from datetime import datetime
-from backend.db import Base, engine
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from backend.db import Base, engine, SessionLocal
+from backend.blob_store import blob_store
+from backend.thumbnails import thumbnail_store
+from backend.geo import geo_columns
+from backend.stats import record_scans
+from backend.model_loader import model_version as current_model_version
+from backend import metrics
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, tuple_, func, update, inspect, text
+from sqlalchemy.exc import IntegrityError
 
 class Scan(Base):
     __tablename__ = "scans"
@@ -13,46 +22,263 @@ class Scan(Base):
     crop = Column(String)
     top_label = Column(String)
     confidence = Column(Float)
-    image_base64 = Column(String)   # store image as base64
-    image_path = Column(String, nullable=True)
-    geo = Column(String, nullable=True)
+    # legacy: images used to be stored inline; see migrate_images.py. Deferred so row loads skip it.
+    image_base64 = deferred(Column(String, nullable=True))
+    image_path = Column(String, nullable=True, index=True)  # blob_store key (sha256 of the image)
+    geo = Column(String, nullable=True)  # "lat,lon" as submitted; lat/lon below are parsed from it
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    # geo.GRID_DEG grid indices (floor(lat / GRID_DEG), floor(lon / GRID_DEG)) for spatial lookups
+    cell_y = Column(Integer, nullable=True)
+    cell_x = Column(Integer, nullable=True)
     notes = Column(String, nullable=True)
     treatment = Column(String, nullable=True)
+    # version of the model (general or crop specialist) that produced top_label; NULL for scans from before it was tracked
+    model_version = Column(String, nullable=True)
+
+    __table_args__ = (
+        # keyset pagination on (timestamp, id), optionally narrowed by crop or label
+        Index("ix_scans_timestamp_id", "timestamp", "id"),
+        Index("ix_scans_crop_timestamp_id", "crop", "timestamp", "id"),
+        Index("ix_scans_label_timestamp_id", "top_label", "timestamp", "id"),
+        # heatmap: bbox + time window aggregated from the index alone
+        Index("ix_scans_cell_timestamp_label", "cell_y", "cell_x", "timestamp", "top_label"),
+        # nearby outbreaks of one label
+        Index("ix_scans_label_cell_timestamp", "top_label", "cell_y", "cell_x", "timestamp"),
+    )
+
+class IdBlock(Base):
+    __tablename__ = "id_blocks"
+
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+# metadata columns returned by /history; never the image
+HISTORY_COLUMNS = (Scan.id, Scan.timestamp, Scan.crop, Scan.top_label, Scan.confidence, Scan.image_path, Scan.notes, Scan.treatment, Scan.model_version)
 
 Base.metadata.create_all(bind=engine)
 
 
-def create_scan_record(db: Session, image_bytes, crop, top_result, geo, notes):
-    encoded = base64.b64encode(image_bytes).decode()
+def _add_missing_columns(table):
+    # create_all never alters an existing table; add nullable columns introduced since
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"))
+
+
+def analyze():
+    # refresh SQLite planner statistics; without them it prefers (top_label, timestamp)
+    # over the grid indexes for geo lookups. analysis_limit keeps this to milliseconds.
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("PRAGMA analysis_limit=1000"))
+        conn.execute(text("ANALYZE"))
+
+
+_add_missing_columns(Scan.__table__)
+# create_all skips existing tables, so add indexes introduced after the table was created
+_existing_indexes = {ix["name"] for ix in inspect(engine).get_indexes(Scan.__tablename__)}
+for _index in Scan.__table__.indexes:
+    _index.create(bind=engine, checkfirst=True)
+if any(ix.name not in _existing_indexes for ix in Scan.__table__.indexes):
+    analyze()
+
+
+class IdAllocator:
+    """
+    Hands out scan ids before the row is written (hi/lo): each process reserves a
+    block of ids from id_blocks in one short transaction, then serves them from
+    memory. Safe across processes; ids left in a block at exit are skipped.
+    """
+
+    def __init__(self, name="scans", block_size=1000):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve(self):
+        db = SessionLocal()
+        try:
+            for _ in range(3):
+                # the UPDATE takes SQLite's write lock, so the read below sees our own reservation
+                res = db.execute(
+                    update(IdBlock).where(IdBlock.name == self.name).values(next_id=IdBlock.next_id + self.block_size)
+                )
+                if res.rowcount:
+                    end = db.query(IdBlock.next_id).filter(IdBlock.name == self.name).scalar()
+                    db.commit()
+                    return end - self.block_size, end
+                # first use: start after the rows written before id_blocks existed
+                start = (db.query(func.max(Scan.id)).scalar() or 0) + 1
+                db.add(IdBlock(name=self.name, next_id=start + self.block_size))
+                try:
+                    db.commit()
+                    return start, start + self.block_size
+                except IntegrityError:
+                    db.rollback()
+            raise RuntimeError("Could not reserve scan ids")
+        finally:
+            db.close()
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve()
+            self._next += 1
+            return self._next - 1
+
+
+scan_ids = IdAllocator()
+
+
+def store_image(image_bytes, digest=None):
+    # digest: sha256 of image_bytes if the caller already hashed them (ingest.read_upload); returns the blob key
+    key = blob_store.put(image_bytes, key=digest)
+    thumbnail_store.schedule(key)
+    return key
+
+
+def _new_scan(image_bytes, crop, top_result, geo, notes, scan_id=None, timestamp=None, digest=None, model_version=None, image_path=None):
+    # image_path: blob key from an earlier store_image(); image_bytes is then unused
+    key = image_path or store_image(image_bytes, digest)
+    treatment = top_result.get("treatment", "")
+    if isinstance(treatment, dict):
+        # recommendations.json entries are dicts; the column holds text
+        treatment = json.dumps(treatment)
 
-    scan = Scan(
+    return Scan(
+        id=scan_id if scan_id is not None else scan_ids.next(),
+        timestamp=timestamp or datetime.utcnow(),
         crop=crop,
-        top_label=top_result["label"],
-        confidence=top_result["confidence"],
-        image_base64=encoded,
+        top_label=top_result.get("label"),
+        confidence=top_result.get("confidence"),
+        image_path=key,
         geo=geo,
         notes=notes,
-        treatment=top_result.get("treatment", "")
+        treatment=treatment,
+        model_version=model_version or current_model_version(),
+        **geo_columns(geo)
     )
 
-    db.add(scan)
-    db.commit()
-    db.refresh(scan)
+
+def create_scan_record(db: Session, image_bytes, crop, top_result, geo, notes):
+    with metrics.timed("db_write"):
+        scan = _new_scan(image_bytes, crop, top_result, geo, notes)
+
+        db.add(scan)
+        record_scans(db, [scan])
+        db.commit()
+        db.refresh(scan)
     return scan
 
 
+def create_scan_records(db: Session, records):
+    # records: dicts with create_scan_record's keyword arguments, plus optional
+    # pre-allocated scan_id and timestamp; one transaction for all
+    if not records:
+        return []
+    with metrics.timed("db_write"):
+        scans = [_new_scan(**r) for r in records]
+        ids = [s.id for s in scans]
+        db.add_all(scans)
+        record_scans(db, scans)
+        db.commit()
+    return ids
+
+
 def get_recent_scans(db: Session, limit=50):
     return db.query(Scan).order_by(Scan.timestamp.desc()).limit(limit).all()
 
 
+def encode_cursor(timestamp, scan_id):
+    raw = f"{timestamp.isoformat()}|{scan_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # raises ValueError on a malformed cursor
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, scan_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(scan_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def scan_filters(crop=None, label=None, min_confidence=None, max_confidence=None, since=None, until=None):
+    # WHERE terms shared by /history and the bulk export
+    terms = []
+    if crop:
+        terms.append(Scan.crop == crop)
+    if label:
+        terms.append(Scan.top_label == label)
+    if min_confidence is not None:
+        terms.append(Scan.confidence >= min_confidence)
+    if max_confidence is not None:
+        terms.append(Scan.confidence <= max_confidence)
+    if since is not None:
+        terms.append(Scan.timestamp >= since)
+    if until is not None:
+        terms.append(Scan.timestamp < until)
+    return terms
+
+
+def list_scans(db: Session, limit=50, cursor=None, crop=None, label=None,
+               min_confidence=None, max_confidence=None, since=None, until=None):
+    """
+    Newest-first page of scan metadata. Returns (rows, next_cursor); pass
+    next_cursor back to get the following page, None means no more rows.
+    """
+    q = db.query(*HISTORY_COLUMNS).filter(*scan_filters(crop, label, min_confidence, max_confidence, since, until))
+    if cursor:
+        ts, scan_id = decode_cursor(cursor)
+        q = q.filter(tuple_(Scan.timestamp, Scan.id) < (ts, scan_id))
+
+    rows = q.order_by(Scan.timestamp.desc(), Scan.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return rows, next_cursor
+
+
 def get_scan(db: Session, scan_id: int):
     return db.query(Scan).filter(Scan.id == scan_id).first()
 
 
-def delete_scan(db: Session, scan_id: int):
+def load_scan_image(scan):
+    # image bytes from the blob store, falling back to the legacy base64 column
+    if scan.image_path and blob_store.exists(scan.image_path):
+        return blob_store.get(scan.image_path)
+    if scan.image_base64:
+        return base64.b64decode(scan.image_base64)
+    return None
+
+
+def delete_scan(db: Session, scan_id: int, release=None):
     scan = get_scan(db, scan_id)
     if not scan:
         return False
+    key = scan.image_path
+    record_scans(db, [scan], delta=-1)
     db.delete(scan)
     db.commit()
+    # the blob may still be shared with other rows or with scans queued for writing,
+    # so it is not removed here: release(key) hands it to the scan writer (collect_blob)
+    if key and release is not None:
+        release(key)
+    return True
+
+
+def collect_blob(db: Session, key):
+    # blobs are shared between identical uploads; drop one (and its thumbnails) once no row references it
+    if db.query(Scan.id).filter(Scan.image_path == key).first():
+        return False
+    blob_store.delete(key)
+    thumbnail_store.delete(key)
     return True
@@ -1,14 +1,27 @@
 # backend/db.py
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./crop_scans.db"
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./crop_scans.db")
 
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False}
 )
 
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL lets readers run alongside the scan writer; NORMAL syncs at checkpoints, not every commit
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.close()
+
+# other databases (DATABASE_URL from the environment) would reject the PRAGMAs
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
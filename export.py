@@ -0,0 +1,140 @@
+# backend/export.py
+# Streaming bulk export of scans. Rows come off a server-side cursor
+# chunk_rows at a time and each chunk is encoded and handed on before the next
+# is fetched, so memory stays flat however large the table is.
+import io
+import os
+import csv
+import base64
+
+from sqlalchemy import select
+
+from backend.db import SessionLocal
+from backend.crud import Scan, scan_filters
+from backend.blob_store import blob_store
+
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_FORMATS = ("csv", "parquet")
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+# output name -> column; names match /history where they overlap
+EXPORT_COLUMNS = (
+    ("id", Scan.id), ("timestamp", Scan.timestamp), ("crop", Scan.crop), ("label", Scan.top_label),
+    ("confidence", Scan.confidence), ("geo", Scan.geo), ("lat", Scan.lat), ("lon", Scan.lon),
+    ("notes", Scan.notes), ("treatment", Scan.treatment), ("image_path", Scan.image_path),
+    ("model_version", Scan.model_version),
+)
+
+
+class StreamSink(io.RawIOBase):
+    # unseekable write target that hands back whatever was written since the last drain
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _iter_chunks(filters, include_images, chunk_rows):
+    columns = [col for _, col in EXPORT_COLUMNS]
+    if include_images:
+        columns.append(Scan.image_base64)  # legacy rows that were never moved to the blob store
+    stmt = select(*columns).where(*scan_filters(**filters)).order_by(Scan.id)
+    db = SessionLocal()
+    try:
+        # stream_results keeps the DBAPI cursor open instead of buffering the whole result
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
+
+
+def _image_bytes(row):
+    if row.image_path and blob_store.exists(row.image_path):
+        return blob_store.get(row.image_path)
+    if row.image_base64:
+        return base64.b64decode(row.image_base64)
+    return None
+
+
+def export_csv(filters=None, include_images=False, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    # yields UTF-8 CSV; with include_images the last column is the image as base64
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS] + (["image_base64"] if include_images else []))
+    yield buf.getvalue().encode("utf-8")
+    written = 0
+    for rows in _iter_chunks(filters or {}, include_images, chunk_rows):
+        buf.seek(0)
+        buf.truncate()
+        for row in rows:
+            values = list(row[:len(EXPORT_COLUMNS)])
+            values[1] = values[1].isoformat() if values[1] else None
+            if include_images:
+                image = row.image_base64
+                if image is None:
+                    data = _image_bytes(row)
+                    image = base64.b64encode(data).decode() if data else None
+                values.append(image)
+            writer.writerow(values)
+        written += len(rows)
+        if progress:
+            progress(written)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _arrow_schema(include_images):
+    import pyarrow as pa
+    types = {
+        "id": pa.int64(), "timestamp": pa.timestamp("us"), "confidence": pa.float64(),
+        "lat": pa.float64(), "lon": pa.float64(),
+    }
+    fields = [pa.field(name, types.get(name, pa.string())) for name, _ in EXPORT_COLUMNS]
+    if include_images:
+        fields.append(pa.field("image", pa.binary()))
+    return pa.schema(fields)
+
+
+def export_parquet(filters=None, include_images=False, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    # yields a Parquet file, one row group per chunk; needs pyarrow
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = _arrow_schema(include_images)
+    sink = StreamSink()
+    written = 0
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in _iter_chunks(filters or {}, include_images, chunk_rows):
+            data = {name: [row[i] for row in rows] for i, (name, _) in enumerate(EXPORT_COLUMNS)}
+            if include_images:
+                data["image"] = [_image_bytes(row) for row in rows]
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            written += len(rows)
+            if progress:
+                progress(written)
+            yield sink.drain()
+    yield sink.drain()
+
+
+EXPORTERS = {"csv": export_csv, "parquet": export_parquet}
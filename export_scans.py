@@ -0,0 +1,45 @@
+# backend/export_scans.py
+# Export scans to CSV or Parquet from the command line, streaming like /export.
+#   python -m backend.export_scans --output scans.parquet [--include-images] [--since 2024-01-01] [--label TomatoEarlyBlight]
+#   python -m backend.export_scans --format csv --output - > scans.csv
+import sys
+import argparse
+from datetime import datetime
+
+from backend.export import EXPORTERS, EXPORT_FORMATS, EXPORT_CHUNK_ROWS
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stream scans to CSV or Parquet")
+    ap.add_argument("--output", required=True, help="file path, or - for stdout (CSV only)")
+    ap.add_argument("--format", choices=EXPORT_FORMATS, help="default: from the output extension, else csv")
+    ap.add_argument("--include-images", action="store_true")
+    ap.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    ap.add_argument("--crop")
+    ap.add_argument("--label")
+    ap.add_argument("--min-confidence", type=float)
+    ap.add_argument("--max-confidence", type=float)
+    ap.add_argument("--since", type=datetime.fromisoformat)
+    ap.add_argument("--until", type=datetime.fromisoformat)
+    args = ap.parse_args()
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    if fmt == "parquet" and args.output == "-":
+        ap.error("Parquet cannot be written to stdout; give a file path")
+    filters = {"crop": args.crop, "label": args.label, "min_confidence": args.min_confidence,
+               "max_confidence": args.max_confidence, "since": args.since, "until": args.until}
+
+    def progress(rows):
+        print(f"exported {rows} scans", file=sys.stderr)
+
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in EXPORTERS[fmt](filters, include_images=args.include_images, chunk_rows=args.chunk_rows, progress=progress):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
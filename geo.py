@@ -0,0 +1,152 @@
+# backend/geo.py
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case
+
+# fixed grid the cell_y/cell_x columns are computed on; 0.01° is about 1.1 km of latitude.
+# Changing it requires re-running migrate_geo.py --recompute.
+GRID_DEG = 0.01
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+# heatmap resolutions, as multiples of GRID_DEG
+HEATMAP_FACTORS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+HEATMAP_MAX_CELLS = 4096
+# above this many grid rows a range scan beats an IN list of rows
+MAX_IN_ROWS = 512
+
+
+def parse_geo(geo):
+    # "lat,lon" -> (lat, lon), or None for anything unusable
+    if not geo:
+        return None
+    try:
+        lat, lon = (float(part) for part in geo.split(","))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or math.isnan(lat) or math.isnan(lon):
+        return None
+    return lat, lon
+
+
+def cell_of(lat, lon):
+    return math.floor(lat / GRID_DEG), math.floor(lon / GRID_DEG)
+
+
+def geo_columns(geo):
+    # Scan column values for a "lat,lon" string
+    point = parse_geo(geo)
+    if point is None:
+        return {"lat": None, "lon": None, "cell_y": None, "cell_x": None}
+    cell_y, cell_x = cell_of(*point)
+    return {"lat": point[0], "lon": point[1], "cell_y": cell_y, "cell_x": cell_x}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat, lon, radius_km):
+    # (min_lat, min_lon, max_lat, max_lon) enclosing the circle; no antimeridian wrap
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return max(-90.0, lat - dlat), max(-180.0, lon - dlon), min(90.0, lat + dlat), min(180.0, lon + dlon)
+
+
+def _cell_filter(Scan, min_lat, min_lon, max_lat, max_lon):
+    # row-by-row seeks when the box is a few grid rows tall, one range otherwise
+    y0, x0 = cell_of(min_lat, min_lon)
+    y1, x1 = cell_of(max_lat, max_lon)
+    rows = Scan.cell_y.in_(range(y0, y1 + 1)) if y1 - y0 < MAX_IN_ROWS else Scan.cell_y.between(y0, y1)
+    return [rows, Scan.cell_x.between(x0, x1)]
+
+
+def _coarse(column, factor):
+    # floor division on the grid index; SQL integer division truncates toward zero
+    if factor == 1:
+        return column
+    return case((column >= 0, column // factor), else_=(column - (factor - 1)) // factor)
+
+
+def pick_factor(min_lat, min_lon, max_lat, max_lon, max_cells=HEATMAP_MAX_CELLS):
+    y0, x0 = cell_of(min_lat, min_lon)
+    y1, x1 = cell_of(max_lat, max_lon)
+    for factor in HEATMAP_FACTORS:
+        if math.ceil((y1 - y0 + 1) / factor) * math.ceil((x1 - x0 + 1) / factor) <= max_cells:
+            return factor
+    return HEATMAP_FACTORS[-1]
+
+
+def heatmap(db, min_lat, min_lon, max_lat, max_lon, since=None, until=None, label=None, crop=None, max_cells=HEATMAP_MAX_CELLS):
+    """
+    Label counts per grid cell inside a bounding box. The grid is coarsened so
+    at most max_cells cells come back; aggregation runs in SQL over the
+    (cell_y, cell_x, timestamp, top_label) index without reading table rows.
+    """
+    from backend.crud import Scan
+
+    factor = pick_factor(min_lat, min_lon, max_lat, max_lon, max_cells)
+    gy, gx = _coarse(Scan.cell_y, factor).label("gy"), _coarse(Scan.cell_x, factor).label("gx")
+    q = db.query(gy, gx, Scan.top_label, func.count()).filter(*_cell_filter(Scan, min_lat, min_lon, max_lat, max_lon))
+    if since:
+        q = q.filter(Scan.timestamp >= since)
+    if until:
+        q = q.filter(Scan.timestamp < until)
+    if label:
+        q = q.filter(Scan.top_label == label)
+    if crop:
+        q = q.filter(Scan.crop == crop)
+
+    cell_deg = GRID_DEG * factor
+    cells = {}
+    for y, x, top_label, count in q.group_by(gy, gx, Scan.top_label):
+        cell = cells.get((y, x))
+        if cell is None:
+            cell = cells[(y, x)] = {
+                "lat": round((y + 0.5) * cell_deg, 6), "lon": round((x + 0.5) * cell_deg, 6), "total": 0, "labels": {},
+            }
+        cell["labels"][top_label] = count
+        cell["total"] += count
+    return {
+        "cell_deg": round(cell_deg, 6),
+        "bbox": [min_lat, min_lon, max_lat, max_lon],
+        "cells": sorted(cells.values(), key=lambda c: -c["total"]),
+    }
+
+
+def nearby_scans(db, lat, lon, radius_km, label=None, days=14, limit=200, now=None):
+    """
+    Scans within radius_km of (lat, lon) in the last `days`, nearest first. The
+    grid cells covering the circle narrow the index scan; exact distance is
+    checked in Python on the few rows left.
+    """
+    from backend.crud import Scan
+
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    min_lat, min_lon, max_lat, max_lon = radius_bbox(lat, lon, radius_km)
+    q = (
+        db.query(Scan.id, Scan.timestamp, Scan.crop, Scan.top_label, Scan.confidence, Scan.lat, Scan.lon)
+        .filter(*_cell_filter(Scan, min_lat, min_lon, max_lat, max_lon))
+        .filter(Scan.lat.between(min_lat, max_lat), Scan.lon.between(min_lon, max_lon), Scan.timestamp >= since)
+    )
+    if label:
+        q = q.filter(Scan.top_label == label)
+
+    hits = []
+    for row in q:
+        d = haversine_km(lat, lon, row.lat, row.lon)
+        if d <= radius_km:
+            hits.append((d, row))
+    hits.sort(key=lambda h: h[0])
+    return {
+        "count": len(hits),
+        "since": since.isoformat(),
+        "scans": [
+            {"id": r.id, "timestamp": r.timestamp.isoformat(), "crop": r.crop, "label": r.top_label,
+             "confidence": r.confidence, "lat": r.lat, "lon": r.lon, "distance_km": round(d, 3)}
+            for d, r in hits[:limit]
+        ],
+    }
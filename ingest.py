@@ -0,0 +1,143 @@
+# backend/ingest.py
+# Upload intake in front of the prediction endpoints: bounded chunked reads,
+# format and pixel-count checks from the image header before any full decode,
+# and a sha256 computed while streaming (blob key and prediction cache key).
+import io
+import os
+import hashlib
+
+from PIL import Image
+
+from backend.blob_store import sniff_media_type
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# all files (or the ZIP) of one /predict_batch request together
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("MAX_BATCH_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# same, after ZIP uploads are expanded (sizes as listed in the archive)
+MAX_BATCH_UNCOMPRESSED_BYTES = int(os.environ.get("MAX_BATCH_UNCOMPRESSED_BYTES", str(1024 * 1024 * 1024)))
+# width * height; a 40 MP image decodes to 120 MB of RGB
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", str(40_000_000)))
+READ_CHUNK_BYTES = 64 * 1024
+# give up on finding dimensions in the header after this much data (large EXIF blocks come first in JPEG)
+MAX_HEADER_BYTES = 1024 * 1024
+ALLOWED_MEDIA_TYPES = ("image/jpeg", "image/png", "image/webp", "image/bmp")
+
+# backstop for decodes that do not go through probe() (stored scans being re-scored):
+# Pillow raises DecompressionBombError above twice this
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Upload:
+    __slots__ = ("data", "digest", "media_type", "width", "height")
+
+    def __init__(self, data, digest, media_type, width, height):
+        self.data = data
+        self.digest = digest  # sha256 hex of data
+        self.media_type = media_type
+        self.width = width
+        self.height = height
+
+
+def probe(head, complete=False):
+    """
+    (media_type, width, height) from the leading bytes of an image. Returns None
+    if head is too short to tell yet (only when complete is False); raises
+    UploadRejected for anything we will not decode.
+    """
+    media_type = sniff_media_type(head[:16])
+    if len(head) >= 16 and media_type not in ALLOWED_MEDIA_TYPES:
+        raise UploadRejected(415, f"Unsupported image type ({media_type}); use JPEG, PNG, WEBP or BMP")
+    try:
+        # Image.open parses the header only; pixel data is read lazily
+        with Image.open(io.BytesIO(head)) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        raise UploadRejected(413, f"Image has more than {MAX_IMAGE_PIXELS} pixels")
+    except Exception:
+        if not complete:
+            return None
+        raise UploadRejected(415, "Could not read image header")
+    if media_type not in ALLOWED_MEDIA_TYPES:
+        raise UploadRejected(415, f"Unsupported image type ({media_type}); use JPEG, PNG, WEBP or BMP")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise UploadRejected(413, f"Image is {width}x{height}; the limit is {MAX_IMAGE_PIXELS} pixels")
+    return media_type, width, height
+
+
+def check_image(data):
+    # same checks for bytes that arrived whole (live frames)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise UploadRejected(413, f"Image larger than {MAX_UPLOAD_BYTES} bytes")
+    return probe(data, complete=True)
+
+
+async def read_limited(file, max_bytes=MAX_UPLOAD_BYTES):
+    # raw bytes of an UploadFile, read in chunks and abandoned once over max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected(413, f"Upload larger than {max_bytes} bytes")
+    chunks, size = [], 0
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadRejected(413, f"Upload larger than {max_bytes} bytes")
+        chunks.append(chunk)
+
+
+async def read_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Read one image upload. Multipart bodies are already spooled to a temp file
+    by Starlette, so at most max_bytes of an upload is ever held in memory, and
+    a bad header is rejected after the first chunk instead of after the whole
+    body.
+    """
+    # the multipart parser knows the size already; reject before reading anything
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected(413, f"Upload larger than {max_bytes} bytes")
+    sha = hashlib.sha256()
+    chunks, size = [], 0
+    info = None
+    while True:
+        chunk = await file.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadRejected(413, f"Upload larger than {max_bytes} bytes")
+        sha.update(chunk)
+        chunks.append(chunk)
+        if info is None and size <= MAX_HEADER_BYTES:
+            info = probe(b"".join(chunks) if len(chunks) > 1 else chunk)
+    if not size:
+        raise UploadRejected(400, "Empty file")
+    data = b"".join(chunks)
+    if info is None:
+        info = probe(data, complete=True)
+    return Upload(data, sha.hexdigest(), *info)
+
+
+def read_member(zf, info, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    One image from an uploaded ZIP, held to the same limits as a direct upload.
+    The declared size is checked first, and decompression stops after
+    max_bytes + 1 bytes in case the archive lies about it.
+    """
+    if info.file_size > max_bytes:
+        raise UploadRejected(413, f"Image larger than {max_bytes} bytes")
+    with zf.open(info) as f:
+        data = f.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadRejected(413, f"Image larger than {max_bytes} bytes")
+    if not data:
+        raise UploadRejected(400, "Empty file")
+    probe(data, complete=True)
+    return data
@@ -1,30 +1,198 @@
 # backend/main.py
 import os
-import time
 import io
+import json
 import base64
-from typing import Optional
+import asyncio
+import zipfile
+import functools
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Query, Body
+from sqlalchemy.orm import undefer
+import numpy as np
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Query, Body, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, Response, JSONResponse, PlainTextResponse
 
 # relative imports (work when backend is a package or when you run from backend dir)
 from .db import SessionLocal  # ensure backend/db.py exists
-from .predict import single_predict  # must return dict or raise controlled exceptions
-from .crud import create_scan_record, get_recent_scans, get_scan, delete_scan
-from .report_generator import generate_pdf_report
+from .predict import format_predictions, route, warm_up
+from .batcher import InferenceBatcher
+from .worker_pool import start_pool, stop_pool
+from .prediction_cache import PredictionCache, cache_key, image_digest
+from .model_loader import model_version, load_model, start_background_load, get_state, is_ready
+from .model_registry import registry, GENERAL
+from .crud import Scan, HISTORY_COLUMNS, get_scan, delete_scan, list_scans
+from .scan_writer import scan_writer
+from .stats import query_stats
+from .geo import heatmap, nearby_scans, HEATMAP_MAX_CELLS
+from .export import EXPORTERS, MEDIA_TYPES, StreamSink, parquet_available
+from .blob_store import blob_store, sniff_media_type
+from .preprocess import preprocess_batch, preprocess_image
+from .report_generator import get_pdf_report, report_fingerprint, report_cache
+from .tts_cache import tts_cache
+from .ingest import read_upload, read_limited, read_member, check_image, probe, UploadRejected, MAX_BATCH_UPLOAD_BYTES, MAX_BATCH_UNCOMPRESSED_BYTES
+from .tiling import decode_grid, confident, combine, TILE_OVERLAP, TILE_MAX_EDGE, TILE_BATCH_SIZE
+from .thumbnails import thumbnail_store, content_key, THUMB_SIZES, THUMB_MEDIA_TYPE
+from .places import PlacesClient, PlacesError
+from . import metrics, worker_pool
 
-from gtts import gTTS
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "change_me")
 GOOGLE_MAPS_API_KEY = os.environ.get("GOOGLE_MAPS_API_KEY")
+# how long a prediction waits for room in a full scan queue before giving up on storing it
+SCAN_QUEUE_TIMEOUT = float(os.environ.get("SCAN_QUEUE_TIMEOUT", "5"))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "4"))
+# weight of the newest frame in the live feed's moving average (1 = no smoothing)
+LIVE_EMA_ALPHA = float(os.environ.get("LIVE_EMA_ALPHA", "0.4"))
+LIVE_MAX_FRAME_BYTES = int(os.environ.get("LIVE_MAX_FRAME_BYTES", str(8 * 1024 * 1024)))
+MAX_BULK_REPORTS = 1000
+# thumbnails are content-addressed, so clients and proxies may keep them forever
+THUMB_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 app = FastAPI(title="Crop Disease Detection API (Full)")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["Server-Timing"])
+# per-route latency, in-flight count and the Server-Timing header
+app.add_middleware(metrics.MetricsMiddleware)
+
+# shared pooled client for /stores, cached per geo tile
+places_client = PlacesClient(GOOGLE_MAPS_API_KEY)
+
+# gathers concurrent requests into batched model calls: one batcher per loaded model
+# version, so a batch never mixes an old and a new version during a hot swap
+_batchers = {}
+
+# answers repeated uploads (client retries, re-pressed "Predict") without running the model
+prediction_cache = PredictionCache()
+
+def _cache_stat(field):
+    caches = {"prediction": prediction_cache, "report": report_cache, "tts": tts_cache, "places": places_client}
+    return lambda: {name: c.stats().get(field, 0) for name, c in caches.items()}
+
+def _cache_hit_ratio():
+    ratios = {}
+    for name, stats in (("prediction", prediction_cache.stats()), ("report", report_cache.stats()), ("tts", tts_cache.stats()), ("places", places_client.stats())):
+        hits = stats.get("hits", 0) + stats.get("disk_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        ratios[name] = round(hits / lookups, 4) if lookups else 0.0
+    return ratios
+
+# read at scrape time from the components themselves
+metrics.Collected("crop_batcher_queue_depth", "Images waiting to be batched.", lambda: {key: b.pending() for key, b in list(_batchers.items())}, label="model")
+metrics.Collected("crop_batcher_inflight_batches", "Batches currently in the model.", lambda: {key: b.inflight() for key, b in list(_batchers.items())}, label="model")
+metrics.Collected("crop_models_resident", "Models currently loaded.", lambda: len(registry.stats()["resident"]))
+metrics.Collected("crop_model_evictions_total", "Models dropped to stay within the memory budget.", lambda: registry.evictions, kind="counter")
+metrics.Collected("crop_scan_queue_depth", "Scans waiting to be written.", scan_writer.pending)
+metrics.Collected("crop_scans_written_total", "Scans written by the background writer.", lambda: scan_writer.written, kind="counter")
+metrics.Collected("crop_scans_failed_total", "Scans the background writer failed to store.", lambda: scan_writer.failed, kind="counter")
+metrics.Collected("crop_model_ready", "1 once the model is loaded and warmed up.", lambda: int(is_ready()))
+metrics.Collected("crop_inference_workers_alive", "Live inference worker processes.",
+                  lambda: sum(w["alive"] for w in worker_pool.pool.stats()) if worker_pool.pool else 0)
+metrics.Collected("crop_thumbnails_pending", "Thumbnails queued for generation.", lambda: thumbnail_store.stats()["pending"])
+metrics.Collected("crop_thumbnails_skipped_total", "Thumbnails not queued because the backlog was full.", lambda: thumbnail_store.stats()["skipped"], kind="counter")
+metrics.Collected("crop_cache_hits_total", "Cache hits (memory and disk).", _cache_stat("hits"), kind="counter", label="cache")
+metrics.Collected("crop_cache_misses_total", "Cache misses.", _cache_stat("misses"), kind="counter", label="cache")
+metrics.Collected("crop_cache_hit_ratio", "Hits / lookups since start.", _cache_hit_ratio, label="cache")
+
+def require_model():
+    if not is_ready():
+        state = get_state()
+        raise HTTPException(status_code=503, detail=f"Model not ready ({state['status']})", headers={"Retry-After": "5"})
+
+async def read_image(file):
+    # bounded read + header checks (ingest.py); 413/415 before any decode
+    with metrics.timed("read"):
+        try:
+            return await read_upload(file)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+def _sweep_batchers():
+    # stop batchers of versions that were swapped out or evicted once their last request is answered;
+    # runs when a batcher is created, after a reload, and whenever a batcher goes idle
+    for key, old in list(_batchers.items()):
+        current = registry.resident(key.split(":", 1)[0])
+        if (current is None or current.key != key) and old.idle():
+            del _batchers[key]
+            asyncio.get_running_loop().create_task(old.stop())
+
+def batcher_for(entry):
+    # entry: model_registry.LoadedModel
+    b = _batchers.get(entry.key)
+    if b is None:
+        b = _batchers[entry.key] = InferenceBatcher(predict_fn=entry.predict, on_idle=_sweep_batchers)
+        _sweep_batchers()
+    return b
+
+def general_model():
+    require_model()
+    return registry.get(GENERAL)
+
+async def route_specialist(img, result, top_k=3):
+    # re-run an image the general model triaged through its crop's specialist, if there is one
+    name = registry.specialist_for(result["crop"])
+    if name is None:
+        return result
+    try:
+        # every use counts for the LRU, not just the load
+        specialist = registry.touch(name)
+        if specialist is None:
+            # first use: load off the event loop
+            specialist = await asyncio.get_running_loop().run_in_executor(None, registry.get, name)
+        preds = await batcher_for(specialist).submit_array(img)
+    except Exception as e:
+        print(f"Specialist {name} unavailable, keeping general predictions:", e)
+        return result
+    return route(result, specialist, preds, top_k)
+
+async def predict_cached(image_bytes, top_k=3, digest=None):
+    # digest: sha256 of image_bytes when the caller already has it
+    with metrics.timed("cache"):
+        key = cache_key(digest or image_digest(image_bytes), f"{registry.version_key()}:top{top_k}")
+        result = prediction_cache.get(key)
+    if result is None:
+        general = general_model()
+        # decode once; the same array goes to the general model and the specialist
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        img = (await loop.run_in_executor(None, functools.partial(ctx.run, preprocess_image, image_bytes)))[0]
+        result = format_predictions(await batcher_for(general).submit_array(img), top_k=top_k, model=general)
+        result = await route_specialist(img, result, top_k)
+        prediction_cache.put(key, result)
+    return result
+
+async def queue_scan(record):
+    # returns the pre-allocated scan_id; the blob is written here, the row itself by scan_writer
+    with metrics.timed("scan_enqueue"):
+        # off the event loop: the blob write, and any backpressure wait for the writer to drain
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(scan_writer.submit, record, timeout=SCAN_QUEUE_TIMEOUT))
+
+@app.on_event("startup")
+async def start_batcher():
+    # no-op unless INFERENCE_WORKERS > 0
+    pool = start_pool()
+    scan_writer.start()
+    # model loads and warms up in the background; other routes serve right away
+    start_background_load(load_fn=pool.wait_ready if pool else load_model, warmup_fn=warm_up)
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    for b in list(_batchers.values()):
+        await b.stop()
+    _batchers.clear()
+    stop_pool()
+    # flush pending scans before the process exits
+    await asyncio.get_running_loop().run_in_executor(None, scan_writer.stop)
+    await asyncio.get_running_loop().run_in_executor(None, thumbnail_store.close)
+    await places_client.close()
 
 def get_db():
     db = SessionLocal()
@@ -37,78 +205,381 @@ def get_db():
 def root():
     return {"message": "Crop Disease Detection API is running!"}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+def ready():
+    # readiness probe: 200 once the model is loaded and warmed up, 503 before
+    state = get_state()
+    state["model_version"] = model_version()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
 @app.post("/predict")
 async def predict_endpoint(
     file: UploadFile = File(...),
     lat: Optional[float] = Query(None),
     lon: Optional[float] = Query(None),
-    notes: Optional[str] = Query(None),
-    db = Depends(get_db)
+    notes: Optional[str] = Query(None)
 ):
     """
-    Single image prediction. Returns top_k predictions, crop, and scan_id.
+    Single image prediction. Returns top_k predictions, crop, the model and
+    version that answered, the triage call when a specialist did, and scan_id.
     """
     try:
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(status_code=400, detail="Empty file")
-        # single_predict must return dict { "top_k": [ {"label":..., "confidence":...}, ... ], "crop": "..."}
-        result = single_predict(image_bytes, top_k=3)
+        upload = await read_image(file)
+        image_bytes = upload.data
+        # result is a dict { "top_k": [ {"label":..., "confidence":...}, ... ], "crop": "..."}
+        result = await predict_cached(image_bytes, top_k=3, digest=upload.digest)
     except HTTPException:
         raise
     except Exception as e:
         # bubble up a helpful message
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
-    # store minimal info (use create_scan_record from crud)
+    # store minimal info; written to the DB in the background by scan_writer
     try:
         geo = f"{lat},{lon}" if lat is not None and lon is not None else None
         top = result.get("top_k", [])
-        top_label = top[0]["label"] if top else None
-        confidence = float(top[0]["confidence"]) if top else None
-        scan = create_scan_record(db, image_bytes=image_bytes, crop=result.get("crop"), top_result=top_label, geo=geo, notes=notes, confidence=confidence)
-        scan_id = getattr(scan, "id", None)
+        scan_id = await queue_scan({"image_bytes": image_bytes, "digest": upload.digest, "crop": result.get("crop"), "top_result": top[0] if top else {}, "geo": geo, "notes": notes,
+                                  "model_version": result.get("model_version")})
     except Exception:
         # if DB fails, still return prediction so frontend can show results
         scan_id = None
 
-    return {"top_k": result.get("top_k", []), "crop": result.get("crop"), "scan_id": scan_id}
+    # triage: the general model's call when a crop specialist answered, else None
+    return {"top_k": result.get("top_k", []), "crop": result.get("crop"), "model": result.get("model"),
+            "model_version": result.get("model_version"), "triage": result.get("triage"), "scan_id": scan_id}
+
+async def predict_tiled(image_bytes, top_k=3, overlap=TILE_OVERLAP, stop_at=None):
+    # same steps as tiling.tiled_predict, but tiles share the batcher with other requests
+    general = general_model()
+    batcher = batcher_for(general)
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    grid = await loop.run_in_executor(None, functools.partial(ctx.run, decode_grid, image_bytes, overlap))
+    parts = []
+    stopped = False
+    for start, stop in grid.ranges(TILE_BATCH_SIZE):
+        # tiles are views into the decoded image; the batcher's stack is the only copy
+        t0 = time.perf_counter()
+        rows = await asyncio.gather(*[batcher.submit_array(grid.tile(k), record=False) for k in range(start, stop)])
+        metrics.note("tile_infer", time.perf_counter() - t0)
+        scores = np.asarray(rows, dtype=np.float32)
+        parts.append(scores)
+        if confident(scores, stop_at, general.labels) and stop < len(grid):
+            stopped = True
+            break
+    return combine(grid, np.concatenate(parts), general, top_k=top_k, stopped=stopped)
+
+@app.post("/predict_tiled")
+async def predict_tiled_endpoint(
+    file: UploadFile = File(...),
+    top_k: int = Query(3, ge=1, le=10),
+    overlap: float = Query(TILE_OVERLAP, ge=0.0, le=0.75),
+    stop_at: Optional[float] = Query(None, gt=0.0, le=1.0),
+    lat: Optional[float] = Query(None),
+    lon: Optional[float] = Query(None),
+    notes: Optional[str] = Query(None)
+):
+    """
+    Prediction for large photos (whole plants, fields). The image is scanned in
+    overlapping 224 px tiles instead of being squashed to 224x224; returns the
+    image-level top_k plus a per-tile map. With stop_at, scanning stops after
+    the first batch in which any tile shows a disease at that confidence.
+    """
+    try:
+        upload = await read_image(file)
+        image_bytes = upload.data
+        with metrics.timed("cache"):
+            key = cache_key(upload.digest, f"{registry.version_key()}:tiled:{overlap}:{TILE_MAX_EDGE}:{stop_at}:top{top_k}")
+            result = prediction_cache.get(key)
+        if result is None:
+            result = await predict_tiled(image_bytes, top_k=top_k, overlap=overlap, stop_at=stop_at)
+            prediction_cache.put(key, result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+    try:
+        geo = f"{lat},{lon}" if lat is not None and lon is not None else None
+        top = result.get("top_k", [])
+        scan_id = await queue_scan({"image_bytes": image_bytes, "digest": upload.digest, "crop": result.get("crop"), "top_result": top[0] if top else {}, "geo": geo, "notes": notes,
+                                  "model_version": result.get("model_version")})
+    except Exception:
+        scan_id = None
+
+    return dict(result, scan_id=scan_id)
 
 @app.post("/predict_live")
 async def predict_live_endpoint(file: UploadFile = File(...)):
     try:
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(status_code=400, detail="Empty file")
-        result = single_predict(image_bytes, top_k=3)
-        return result
+        upload = await read_image(file)
+        return await predict_cached(upload.data, top_k=3, digest=upload.digest)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Live prediction failed: {e}")
 
-@app.get("/history")
-def history(limit: int = 200, db = Depends(get_db)):
-    rows = get_recent_scans(db, limit=limit)
+class _LatestFrame:
+    # one-slot mailbox: a frame that arrives before the previous one was taken replaces it
+    def __init__(self):
+        self.frame = None
+        self.seq = 0
+        self.dropped = 0
+        self.reset = False
+        self.closed = False
+        self._event = asyncio.Event()
+
+    def put(self, data):
+        if self.frame is not None:
+            self.dropped += 1
+            metrics.LIVE_FRAMES_DROPPED.inc()
+        self.seq += 1
+        self.frame = (self.seq, data)
+        self._event.set()
+
+    def close(self):
+        self.closed = True
+        self._event.set()
+
+    async def take(self):
+        # newest (seq, bytes), or None once the client has gone
+        while self.frame is None and not self.closed:
+            self._event.clear()
+            await self._event.wait()
+        if self.closed:
+            return None
+        frame, self.frame = self.frame, None
+        return frame
+
+@app.websocket("/ws/predict_live")
+async def predict_live_ws(websocket: WebSocket, top_k: int = 3, alpha: float = LIVE_EMA_ALPHA):
+    """
+    Continuous scanning. The client sends JPEG/PNG frames as binary messages as
+    fast as it likes; only the newest frame is inferred and older unprocessed ones
+    are dropped. Each result carries the exponential moving average of the class
+    probabilities (top_k, crop) and the frame's own prediction (raw_top_k).
+    Send the text message {"reset": true} to restart smoothing on a new plant.
+    """
+    await websocket.accept()
+    if not is_ready():
+        await websocket.send_json({"error": f"Model not ready ({get_state()['status']})"})
+        await websocket.close(code=1013)  # try again later
+        return
+    top_k = max(1, min(top_k, 10))
+    alpha = min(max(alpha, 0.01), 1.0)
+    mailbox = _LatestFrame()
+
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    mailbox.put(message["bytes"])
+                    continue
+                try:
+                    control = json.loads(message.get("text") or "{}")
+                except ValueError:
+                    continue
+                if isinstance(control, dict) and control.get("reset"):
+                    mailbox.reset = True
+        finally:
+            mailbox.close()
+
+    receiver = asyncio.create_task(receive())
+    metrics.LIVE_SESSIONS.inc()
+    ema = None
+    ema_model = None
+    try:
+        while True:
+            item = await mailbox.take()
+            if item is None:
+                break
+            seq, data = item
+            if len(data) > LIVE_MAX_FRAME_BYTES:
+                await websocket.send_json({"frame": seq, "error": f"Frame larger than {LIVE_MAX_FRAME_BYTES} bytes"})
+                continue
+            try:
+                check_image(data)
+            except UploadRejected as e:
+                await websocket.send_json({"frame": seq, "error": e.detail})
+                continue
+            t0 = time.perf_counter()
+            try:
+                # live frames stay on the general model; specialists would add a second model call per frame
+                general = registry.get(GENERAL)
+                scores = np.asarray(await batcher_for(general).submit(data), dtype=np.float32)
+            except Exception as e:
+                await websocket.send_json({"frame": seq, "error": f"Live prediction failed: {e}"})
+                continue
+            metrics.LIVE_FRAMES.inc()
+            if ema is None or mailbox.reset or ema_model != general.key:
+                # a hot swap may change the classes, so smoothing restarts with the new model
+                ema, mailbox.reset, ema_model = scores, False, general.key
+            else:
+                ema = alpha * scores + (1 - alpha) * ema
+            smoothed = format_predictions(ema, top_k=top_k, model=general)
+            await websocket.send_json({
+                "frame": seq,
+                "crop": smoothed["crop"],
+                "top_k": smoothed["top_k"],
+                "raw_top_k": format_predictions(scores, top_k=top_k, model=general)["top_k"],
+                "dropped": mailbox.dropped,
+                "latency_ms": round((time.perf_counter() - t0) * 1000, 1),
+            })
+    except (WebSocketDisconnect, RuntimeError):
+        # client went away mid-send
+        pass
+    finally:
+        metrics.LIVE_SESSIONS.dec()
+        receiver.cancel()
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+def _list_uploads(uploads):
+    """
+    uploads: [(filename, bytes)] -> (entries, archives). A ZIP upload is
+    replaced by the images inside it, listed from the central directory only;
+    _read_entries() decompresses them a batch at a time. archives are the open
+    ZipFiles, for the caller to close. Raises UploadRejected once the listed
+    sizes pass MAX_BATCH_UNCOMPRESSED_BYTES.
+    """
+    entries, archives, total = [], [], 0
+    try:
+        for name, data in uploads:
+            if zipfile.is_zipfile(io.BytesIO(data)):
+                zf = zipfile.ZipFile(io.BytesIO(data))
+                archives.append(zf)
+                members = []
+                for info in zf.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or base.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if base.lower().endswith(IMAGE_EXTENSIONS):
+                        members.append((info.filename, zf, info))
+                        total += info.file_size
+            else:
+                members = [(name, data, None)]
+                total += len(data)
+            if total > MAX_BATCH_UNCOMPRESSED_BYTES:
+                raise UploadRejected(413, f"Uploads expand to more than {MAX_BATCH_UNCOMPRESSED_BYTES} bytes in total")
+            entries.extend(members)
+    except Exception:
+        for zf in archives:
+            zf.close()
+        raise
+    return entries, archives
+
+def _read_entries(entries):
+    # [(filename, bytes)] for one batch of _list_uploads() entries; an image that fails to read or is rejected gets its exception instead
     out = []
-    for s in rows:
-        out.append({
-            "id": s.id,
-            "timestamp": s.timestamp.isoformat(),
-            "crop": s.crop,
-            "label": s.top_label,
-            "confidence": s.confidence,
-            "image_path": s.image_path,
-            "notes": s.notes,
-            "treatment": s.treatment
-        })
+    for name, source, info in entries:
+        try:
+            if info is None:
+                probe(source, complete=True)
+                out.append((name, source))
+            else:
+                out.append((name, read_member(source, info)))
+        except Exception as e:
+            out.append((name, e))
     return out
 
-@app.get("/scan/{scan_id}")
-def get_scan_endpoint(scan_id: int, db = Depends(get_db)):
-    s = get_scan(db, scan_id)
-    if not s:
-        raise HTTPException(status_code=404, detail="Scan not found")
+@app.post("/predict_batch")
+async def predict_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    lat: Optional[float] = Query(None),
+    lon: Optional[float] = Query(None),
+    notes: Optional[str] = Query(None)
+):
+    """
+    Bulk prediction for many images (multipart files or one ZIP).
+    Streams one JSON line per image as each batch finishes.
+    """
+    require_model()
+    uploads, budget = [], MAX_BATCH_UPLOAD_BYTES
+    for f in files:
+        try:
+            data = await read_limited(f, budget)
+        except UploadRejected:
+            raise HTTPException(status_code=413, detail=f"Uploads larger than {MAX_BATCH_UPLOAD_BYTES} bytes in total")
+        budget -= len(data)
+        uploads.append((f.filename, data))
+    loop = asyncio.get_running_loop()
+    try:
+        entries, archives = await loop.run_in_executor(None, _list_uploads, uploads)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Could not read ZIP upload: {e}")
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if not entries:
+        for zf in archives:
+            zf.close()
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    geo = f"{lat},{lon}" if lat is not None and lon is not None else None
+
+    async def stream():
+        try:
+            async for line in _predict_entries(entries, geo, notes):
+                yield line
+        finally:
+            for zf in archives:
+                zf.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def _predict_entries(entries, geo, notes):
+    # one NDJSON chunk per batch; ZIP members are decompressed only when their batch comes up
+    loop = asyncio.get_running_loop()
+    general = registry.get(GENERAL)
+    batcher = batcher_for(general)
+    size = batcher.max_batch_size
+    for start in range(0, len(entries), size):
+        chunk = await loop.run_in_executor(None, _read_entries, entries[start:start + size])
+        unreadable = [data if isinstance(data, Exception) else None for _, data in chunk]
+        decoded, errors = await loop.run_in_executor(None, preprocess_batch, [b"" if err else data for (_, data), err in zip(chunk, unreadable)])
+        ok = [i for i, err in enumerate(errors) if err is None]
+        preds = await asyncio.gather(*[batcher.submit_array(decoded[i]) for i in ok], return_exceptions=True)
+        routed = await asyncio.gather(*[
+            route_specialist(decoded[i], format_predictions(p, top_k=3, model=general))
+            for i, p in zip(ok, preds) if not isinstance(p, Exception)
+        ])
+        routed = iter(routed)
+
+        lines = [None] * len(chunk)
+        records, record_idx = [], []
+        for i, err in enumerate(errors):
+            if unreadable[i] is not None:
+                lines[i] = {"filename": chunk[i][0], "error": f"Could not read image: {unreadable[i]}"}
+            elif err is not None:
+                lines[i] = {"filename": chunk[i][0], "error": f"Could not decode image: {err}"}
+        for i, p in zip(ok, preds):
+            if isinstance(p, Exception):
+                lines[i] = {"filename": chunk[i][0], "error": f"Prediction failed: {p}"}
+                continue
+            result = next(routed)
+            top = result.get("top_k", [])
+            lines[i] = {"filename": chunk[i][0], "top_k": top, "crop": result.get("crop"), "model": result.get("model"),
+                        "model_version": result.get("model_version"), "triage": result.get("triage"), "scan_id": None}
+            records.append({"image_bytes": chunk[i][1], "crop": result.get("crop"), "top_result": top[0] if top else {}, "geo": geo, "notes": notes,
+                            "model_version": result.get("model_version")})
+            record_idx.append(i)
+
+        for i, record in zip(record_idx, records):
+            try:
+                lines[i]["scan_id"] = await queue_scan(record)
+            except Exception:
+                # same as /predict: results are still useful without a stored scan
+                pass
+
+        yield "".join(json.dumps(line) + "\n" for line in lines)
+
+def _scan_summary(s):
     return {
         "id": s.id,
         "timestamp": s.timestamp.isoformat(),
@@ -116,29 +587,233 @@ def get_scan_endpoint(scan_id: int, db = Depends(get_db)):
         "label": s.top_label,
         "confidence": s.confidence,
         "image_path": s.image_path,
+        "thumbnail_url": f"/scan/{s.id}/thumbnail",
         "notes": s.notes,
-        "treatment": s.treatment
+        "treatment": s.treatment,
+        "model_version": s.model_version
     }
 
+@app.get("/history")
+def history(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    crop: Optional[str] = None,
+    label: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    max_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db = Depends(get_db)
+):
+    """
+    Newest-first scan metadata, one page at a time. Pass next_cursor back as
+    `cursor` for the following page; filters are applied in SQL.
+    """
+    try:
+        rows, next_cursor = list_scans(
+            db, limit=limit, cursor=cursor, crop=crop, label=label,
+            min_confidence=min_confidence, max_confidence=max_confidence, since=since, until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scans": [_scan_summary(s) for s in rows], "next_cursor": next_cursor}
+
+@app.get("/geo/heatmap")
+def geo_heatmap(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    label: Optional[str] = None,
+    crop: Optional[str] = None,
+    max_cells: int = Query(1024, ge=1, le=HEATMAP_MAX_CELLS),
+    db = Depends(get_db)
+):
+    """
+    Scan counts per label for each grid cell in the bounding box. The cell size
+    (cell_deg) grows with the box so at most max_cells cells are returned.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    return heatmap(db, min_lat, min_lon, max_lat, max_lon, since=since, until=until, label=label, crop=crop, max_cells=max_cells)
+
+@app.get("/geo/nearby")
+def geo_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5, gt=0, le=200),
+    label: Optional[str] = None,
+    days: int = Query(14, ge=1, le=365),
+    limit: int = Query(200, ge=1, le=1000),
+    db = Depends(get_db)
+):
+    # recent scans (of one label, if given) within radius_km, nearest first
+    return nearby_scans(db, lat, lon, radius_km, label=label, days=days, limit=limit)
+
+@app.get("/scan/{scan_id}")
+def get_scan_endpoint(scan_id: int, db = Depends(get_db)):
+    s = db.query(*HISTORY_COLUMNS).filter(Scan.id == scan_id).first()
+    if not s:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return _scan_summary(s)
+
+@app.get("/scan/{scan_id}/image")
+def get_scan_image(scan_id: int, db = Depends(get_db)):
+    row = db.query(Scan.id, Scan.image_path).filter(Scan.id == scan_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    if row.image_path and blob_store.exists(row.image_path):
+        # streamed from disk in chunks, with ETag/Last-Modified from the file
+        return FileResponse(blob_store.path(row.image_path), media_type=blob_store.media_type(row.image_path))
+    # legacy row that migrate_images.py has not moved yet
+    b64 = db.query(Scan.image_base64).filter(Scan.id == scan_id).scalar()
+    if not b64:
+        raise HTTPException(status_code=404, detail="Image not found")
+    data = base64.b64decode(b64)
+    return Response(content=data, media_type=sniff_media_type(data[:16]))
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match requires
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+@app.get("/scan/{scan_id}/thumbnail")
+def get_scan_thumbnail(
+    scan_id: int,
+    request: Request,
+    size: str = Query("sm", pattern=f"^({'|'.join(THUMB_SIZES)})$"),
+    db = Depends(get_db)
+):
+    row = db.query(Scan.id, Scan.image_path).filter(Scan.id == scan_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    key = row.image_path
+    if key:
+        load = lambda: blob_store.get(key) if blob_store.exists(key) else None
+    else:
+        # legacy row: thumbnails are keyed by the hash of the decoded original
+        b64 = db.query(Scan.image_base64).filter(Scan.id == scan_id).scalar()
+        if not b64:
+            raise HTTPException(status_code=404, detail="Image not found")
+        data = base64.b64decode(b64)
+        key, load = content_key(data), lambda: data
+
+    etag = thumbnail_store.etag(key, size)
+    headers = {"ETag": etag, "Cache-Control": THUMB_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = thumbnail_store.get_path(key, size, load=load)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not create thumbnail: {e}")
+    if not path:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path, media_type=THUMB_MEDIA_TYPE, headers=headers)
+
 @app.delete("/scan/{scan_id}")
 def delete_scan_endpoint(scan_id: int, token: str = Query(...), db = Depends(get_db)):
     if token != ADMIN_TOKEN:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    ok = delete_scan(db, scan_id)
+    ok = delete_scan(db, scan_id, release=scan_writer.release)
     if not ok:
         raise HTTPException(status_code=404, detail="Not found")
+    report_cache.invalidate(scan_id)
     return {"deleted": True}
 
 @app.get("/report/{scan_id}")
-def report_endpoint(scan_id: int, db = Depends(get_db)):
+def report_endpoint(scan_id: int, request: Request, db = Depends(get_db)):
     s = get_scan(db, scan_id)
     if not s:
         raise HTTPException(status_code=404, detail="Scan not found")
-    out_dir = os.path.join(os.path.dirname(__file__), "reports")
-    os.makedirs(out_dir, exist_ok=True)
-    out = os.path.join(out_dir, f"report_{scan_id}.pdf")
-    generate_pdf_report(s, out)
-    return {"report_path": out}
+    # the fingerprint is cheap; only render when the client's copy is stale
+    etag = f'"{report_fingerprint(s)}"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    pdf, fingerprint = get_pdf_report(s)
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="report_{scan_id}.pdf"', "ETag": f'"{fingerprint}"'}
+    )
+
+def _report_zip_stream(scan_ids):
+    # unseekable sink: zipfile then streams entries with data descriptors
+    sink = StreamSink()
+    missing = []
+    db = SessionLocal()
+    try:
+        with ThreadPoolExecutor(max_workers=REPORT_WORKERS) as pool, zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            step = REPORT_WORKERS * 4
+            for start in range(0, len(scan_ids), step):
+                chunk = scan_ids[start:start + step]
+                # undefer so render threads never lazy-load through the shared session
+                rows = db.query(Scan).options(undefer(Scan.image_base64)).filter(Scan.id.in_(chunk)).all()
+                by_id = {s.id: s for s in rows}
+                found = [by_id[i] for i in chunk if i in by_id]
+                missing.extend(i for i in chunk if i not in by_id)
+                for s, (pdf, _) in zip(found, pool.map(get_pdf_report, found)):
+                    zf.writestr(f"report_{s.id}.pdf", pdf)
+                yield sink.drain()
+                db.expunge_all()
+            if missing:
+                zf.writestr("missing.txt", "\n".join(str(i) for i in missing) + "\n")
+        yield sink.drain()
+    finally:
+        db.close()
+
+@app.post("/reports/bulk")
+def bulk_reports_endpoint(body: dict = Body(...)):
+    """
+    Body: {"scan_ids": [...]}. Streams a ZIP with one PDF per scan, rendered in parallel.
+    """
+    try:
+        scan_ids = list(dict.fromkeys(int(i) for i in body.get("scan_ids") or []))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="scan_ids must be a list of integers")
+    if not scan_ids:
+        raise HTTPException(status_code=400, detail="Missing scan_ids")
+    if len(scan_ids) > MAX_BULK_REPORTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_REPORTS} reports per request")
+    return StreamingResponse(
+        _report_zip_stream(scan_ids),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="reports.zip"'}
+    )
+
+@app.get("/export")
+def export_endpoint(
+    token: str = Query(...),
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    include_images: bool = False,
+    crop: Optional[str] = None,
+    label: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    max_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """
+    Every matching scan, oldest first, streamed as CSV or Parquet straight off
+    a server-side cursor. Images are included (base64 in CSV, binary in
+    Parquet) only when include_images is set.
+    """
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow on the server; use format=csv")
+    filters = {"crop": crop, "label": label, "min_confidence": min_confidence, "max_confidence": max_confidence, "since": since, "until": until}
+    filename = f"scans-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        EXPORTERS[format](filters, include_images=include_images),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.post("/tts")
 def tts_endpoint(body: dict = Body(...)):
@@ -146,20 +821,23 @@ def tts_endpoint(body: dict = Body(...)):
     lang = body.get("lang", "en")
     if not text:
         raise HTTPException(status_code=400, detail="Missing text")
-    fn = f"tts_{int(time.time())}.mp3"
-    path = os.path.join(os.path.dirname(__file__), "tts_files")
-    os.makedirs(path, exist_ok=True)
-    full = os.path.join(path, fn)
-    gTTS(text=text, lang=lang).save(full)
-    return {"path": full}
+    try:
+        path = tts_cache.get_path(text, lang)
+    except ValueError as e:
+        # gTTS raises ValueError for unsupported languages
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Speech synthesis failed: {e}")
+    return FileResponse(path, media_type="audio/mpeg", filename="speech.mp3")
 
 @app.get("/stores")
-def stores(lat: float, lon: float, radius: int = 5000, query: str = "agro shop"):
+async def stores(lat: float, lon: float, radius: int = 5000, query: str = "agro shop"):
     if not GOOGLE_MAPS_API_KEY:
         return {"error": "Set GOOGLE_MAPS_API_KEY environment variable"}
-    url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={lat},{lon}&radius={radius}&keyword={query}&key={GOOGLE_MAPS_API_KEY}"
-    resp = requests.get(url).json()
-    places = [{"name": p.get("name"), "vicinity": p.get("vicinity")} for p in resp.get("results", [])]
+    try:
+        places = await places_client.nearby(lat, lon, radius, query)
+    except PlacesError as e:
+        raise HTTPException(status_code=502, detail=str(e))
     return {"places": places}
 
 @app.post("/yield_estimate")
@@ -171,11 +849,74 @@ def yield_estimate(body: dict = Body(...)):
     return {"estimated_yield_loss_pct": round(loss*100,2)}
 
 @app.get("/admin/stats")
-def admin_stats(token: str = Query(...), db = Depends(get_db)):
+def admin_stats(
+    token: str = Query(...),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    db = Depends(get_db)
+):
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    # served from the incrementally maintained scan_stats counters
+    return query_stats(db, since=since, until=until, granularity=granularity)
+
+@app.get("/admin/cache")
+def admin_cache(token: str = Query(...)):
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {"prediction_cache": prediction_cache.stats(), "report_cache": report_cache.stats(), "tts_cache": tts_cache.stats(), "places_cache": places_client.stats(), "thumbnails": thumbnail_store.stats()}
+
+@app.delete("/admin/cache")
+def admin_cache_clear(token: str = Query(...)):
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    prediction_cache.clear()
+    return {"cleared": True}
+
+@app.get("/admin/models")
+def admin_models(token: str = Query(...)):
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return registry.stats()
+
+@app.post("/admin/models/reload")
+async def admin_models_reload(token: str = Query(...), name: Optional[List[str]] = Query(None)):
+    """
+    Hot swap: re-read saved_model/models.json and replace every loaded model
+    whose version changed. Requests already running finish on the old version.
+    """
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        swapped = await asyncio.get_running_loop().run_in_executor(None, registry.reload, name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    _sweep_batchers()
+    return {"swapped": swapped, **registry.stats()}
+
+@app.get("/admin/profiler")
+def admin_profiler(token: str = Query(...), limit: Optional[int] = Query(None, ge=1)):
+    """
+    Collapsed stacks sampled since the profiler was last started (flamegraph.pl /
+    speedscope input). Stats are in the X-Profiler-* headers.
+    """
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    stats = metrics.profiler.stats()
+    headers = {"X-Profiler-Running": str(stats["running"]).lower(), "X-Profiler-Samples": str(stats["samples"])}
+    return PlainTextResponse(metrics.profiler.collapsed(limit), headers=headers)
+
+@app.post("/admin/profiler")
+def admin_profiler_toggle(
+    token: str = Query(...),
+    action: str = Query(..., pattern="^(start|stop)$"),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000)
+):
     if token != ADMIN_TOKEN:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    rows = get_recent_scans(db, limit=1000)
-    counts = {}
-    for s in rows:
-        counts[s.top_label] = counts.get(s.top_label, 0) + 1
-    return {"counts": counts, "total_scans": len(rows)}
+    if action == "start":
+        metrics.profiler.start(interval_ms)
+    else:
+        metrics.profiler.stop()
+    return metrics.profiler.stats()
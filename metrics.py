@@ -0,0 +1,286 @@
+# backend/metrics.py
+# In-process metrics in Prometheus text format, per-request Server-Timing and
+# an opt-in sampling profiler. Recording is a bisect plus a short lock, so it
+# stays on in production.
+import os
+import sys
+import time
+import bisect
+import threading
+import contextvars
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# seconds; covers a cache hit (sub-ms) up to a cold model call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "10"))
+# frames kept per sampled stack, innermost last
+PROFILER_MAX_DEPTH = 64
+
+_registry = []
+
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one optional label, e.g. stage="decode"."""
+
+    def __init__(self, name, help, label=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label value -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, label_value=""):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total, count) in sorted(self.snapshot().items()):
+            base = [(self.label, label_value)] if self.label else []
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(base + [('le', _fmt(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(base)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(base)} {count}")
+        return lines
+
+
+class Gauge:
+    """Up/down value, e.g. requests currently in flight."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n=1):
+        with self._lock:
+            self.value -= n
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", f"{self.name} {_fmt(self.value)}"]
+
+
+class Counter(Gauge):
+    """Monotonic total; only inc() is meaningful."""
+
+    kind = "counter"
+
+
+class Collected:
+    """
+    Value read at scrape time from an existing component (queue sizes, cache
+    stats). fn returns a number, or a dict of label value -> number.
+    """
+
+    def __init__(self, name, help, fn, kind="gauge", label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.label = label
+        _registry.append(self)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            # a component that is not started yet should not break the scrape
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(value, dict):
+            for label_value, v in sorted(value.items()):
+                lines.append(f"{self.name}{_labels([(self.label, label_value)])} {_fmt(v)}")
+        else:
+            lines.append(f"{self.name} {_fmt(value)}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram("crop_stage_seconds", "Time spent in each processing stage.", label="stage")
+REQUEST_SECONDS = Histogram("crop_http_request_seconds", "HTTP request latency by route.", label="route")
+BATCH_SIZE = Histogram("crop_inference_batch_size", "Images per model call.", buckets=(1, 2, 4, 8, 16, 32, 64))
+REQUESTS_IN_FLIGHT = Gauge("crop_http_requests_in_flight", "HTTP requests currently being handled.")
+LIVE_SESSIONS = Gauge("crop_live_sessions", "Open /ws/predict_live connections.")
+LIVE_FRAMES = Counter("crop_live_frames_total", "Live frames inferred.")
+LIVE_FRAMES_DROPPED = Counter("crop_live_frames_dropped_total", "Live frames replaced by a newer one before inference.")
+
+# stage -> seconds for the current request; None outside a timed request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def note(stage, seconds):
+    # add to the current request's Server-Timing only (the histogram is recorded elsewhere)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage)
+    note(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0)
+
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items())
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no request/response wrapping): counts in-flight
+    requests, records latency per route template and adds a Server-Timing
+    header listing the stages recorded while handling the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings = {}
+        token = _request_timings.set(timings)
+        t0 = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and timings:
+                timings["total"] = time.perf_counter() - t0
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, getattr(route, "path", "unmatched"))
+            _request_timings.reset(token)
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampler for a running process. A background thread snapshots
+    every thread's stack each interval and tallies them in collapsed form
+    ("thread;outer;...;inner count"), which flamegraph.pl and speedscope read.
+    Nothing runs until start() is called.
+    """
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS, max_depth=PROFILER_MAX_DEPTH):
+        self.interval = max(1.0, float(interval_ms)) / 1000.0
+        self.max_depth = max_depth
+        self._stacks = _Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval_ms=None):
+        if self._thread is not None:
+            return False
+        if interval_ms:
+            self.interval = max(1.0, float(interval_ms)) / 1000.0
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return False
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        return True
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                # walk code objects directly; traceback.extract_stack would read source lines
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                sampled.append(f"{names.get(ident, ident)};" + ";".join(reversed(frames)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+
+    def collapsed(self, limit=None):
+        with self._lock:
+            items = self._stacks.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self):
+        return {"running": self.running, "interval_ms": self.interval * 1000, "samples": self.samples,
+                "distinct_stacks": len(self._stacks), "started_at": self.started_at}
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,55 @@
+# backend/migrate_geo.py
+# Fill the numeric lat/lon and grid cell columns from the legacy "lat,lon" geo strings.
+# Importing backend.crud adds the new columns and indexes to an existing database.
+#   python -m backend.migrate_geo [--batch-size 2000] [--recompute]
+import argparse
+
+from sqlalchemy import update
+
+from backend.db import SessionLocal
+from backend.crud import Scan, analyze
+from backend.geo import geo_columns
+
+
+def migrate_geo(batch_size=2000, recompute=False):
+    # keyset over id; one bulk UPDATE by primary key per batch
+    db = SessionLocal()
+    counts = {"updated": 0, "invalid": 0}
+    last_id = 0
+    try:
+        while True:
+            q = db.query(Scan.id, Scan.geo).filter(Scan.id > last_id, Scan.geo.isnot(None))
+            if not recompute:
+                q = q.filter(Scan.lat.is_(None))
+            rows = q.order_by(Scan.id).limit(batch_size).all()
+            if not rows:
+                break
+            params = []
+            for scan_id, geo in rows:
+                values = geo_columns(geo)
+                if values["lat"] is None:
+                    counts["invalid"] += 1
+                params.append({"id": scan_id, **values})
+            db.execute(update(Scan), params)
+            db.commit()
+            counts["updated"] += len(rows) - sum(1 for p in params if p["lat"] is None)
+            last_id = rows[-1][0]
+            print(f"updated {counts['updated']}, unparseable {counts['invalid']} (last id {last_id})")
+    finally:
+        db.close()
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Populate numeric geo columns from Scan.geo strings")
+    ap.add_argument("--batch-size", type=int, default=2000)
+    ap.add_argument("--recompute", action="store_true", help="also rewrite rows that already have lat/lon (e.g. after changing GRID_DEG)")
+    args = ap.parse_args()
+
+    counts = migrate_geo(args.batch_size, args.recompute)
+    analyze()
+    print(f"done: {counts['updated']} scans located, {counts['invalid']} unparseable geo values left empty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# backend/migrate_images.py
+# Move legacy base64 images out of the scans table into the blob store.
+#   python -m backend.migrate_images --batch-size 200 [--vacuum]
+import base64
+import argparse
+
+from sqlalchemy import text
+
+from backend.db import SessionLocal, engine
+from backend.crud import Scan
+from backend.blob_store import blob_store
+
+
+def migrate_images(batch_size=200):
+    # keyset over id so each batch is one small indexed query and memory stays bounded
+    db = SessionLocal()
+    moved = 0
+    last_id = 0
+    try:
+        while True:
+            rows = (
+                db.query(Scan.id, Scan.image_base64)
+                .filter(Scan.id > last_id, Scan.image_base64.isnot(None))
+                .order_by(Scan.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for scan_id, encoded in rows:
+                key = blob_store.put(base64.b64decode(encoded))
+                db.query(Scan).filter(Scan.id == scan_id).update(
+                    {"image_path": key, "image_base64": None}, synchronize_session=False
+                )
+            db.commit()
+            moved += len(rows)
+            last_id = rows[-1][0]
+            print(f"moved {moved} images (last id {last_id})")
+    finally:
+        db.close()
+    return moved
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Move base64 scan images into the blob store")
+    ap.add_argument("--batch-size", type=int, default=200)
+    ap.add_argument("--vacuum", action="store_true", help="run VACUUM afterwards to shrink the SQLite file")
+    args = ap.parse_args()
+
+    moved = migrate_images(args.batch_size)
+    print(f"done: {moved} images moved")
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("vacuum complete")
+
+
+if __name__ == "__main__":
+    main()
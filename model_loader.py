@@ -1,29 +1,111 @@
 # backend/model_loader.py
 import os
-import tensorflow as tf
+import time
+import threading
+
+from backend.model_registry import registry, GENERAL
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "saved_model", "best_model.h5")
+LABELS_PATH = os.path.join(os.path.dirname(__file__), "labels.txt")
+
+# > 0: the model lives in that many worker processes (see worker_pool.py), not in the API process
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+
+# 0 = keep retrying a failed load forever (with capped backoff)
+MODEL_LOAD_RETRIES = int(os.environ.get("MODEL_LOAD_RETRIES", "0"))
+MODEL_LOAD_BACKOFF = float(os.environ.get("MODEL_LOAD_BACKOFF", "2"))
+MODEL_LOAD_MAX_BACKOFF = 60.0
 
 model = None
 labels = []
 
+def model_version():
+    # version of the current general model; MODEL_VERSION wins, otherwise derived from the
+    # weights file (see model_registry.ModelSpec), so replacing it changes the version
+    return registry.version(GENERAL)
+
+def load_labels():
+    # updated in place so modules that imported `labels` see the new contents
+    if os.path.exists(LABELS_PATH):
+        with open(LABELS_PATH, "r") as f:
+            labels[:] = [l.strip() for l in f.readlines() if l.strip()]
+    return labels
+
+def _sync_general(entry):
+    # keep the single-model globals pointing at the registry's general model
+    global model
+    if entry.name == GENERAL:
+        model = entry.backend
+        labels[:] = entry.labels
+
 def load_model():
-    global model, labels
-    if model is not None:
-        return model
-    if not os.path.exists(MODEL_PATH):
-        raise RuntimeError(f"Model file not found at {MODEL_PATH}")
-    model = tf.keras.models.load_model(MODEL_PATH)
-    # load labels from labels.txt if available
-    labels_file = os.path.join(os.path.dirname(__file__), "labels.txt")
-    if os.path.exists(labels_file):
-        with open(labels_file, "r") as f:
-            labels = [l.strip() for l in f.readlines() if l.strip()]
+    # returns the general model's backend (see backends.py); call .predict(batch) on it.
+    # Specialists load on first use through model_registry.registry.
+    entry = registry.get(GENERAL)
+    _sync_general(entry)
+    return model
+
+registry.on_swap(_sync_general)
+
+class ModelNotReady(RuntimeError):
+    pass
+
+# lifecycle of the background load, reported by /ready
+model_state = {"status": "not_started", "attempts": 0, "error": None, "load_seconds": None, "warmup_seconds": None, "ready_at": None}
+_state_lock = threading.Lock()
+_loader = None
+
+def _set_state(**kwargs):
+    with _state_lock:
+        model_state.update(kwargs)
+
+def get_state():
+    with _state_lock:
+        return dict(model_state)
+
+def is_ready():
+    return model_state["status"] == "ready"
+
+def get_model():
+    if model is None:
+        raise ModelNotReady("Model is not loaded yet")
     return model
 
-# call at import time
-try:
-    load_model()
-except Exception as e:
-    # print to server logs so you see the issue on startup
-    print("Model loading warning:", e)
+def _load_forever(load_fn, warmup_fn, retries, backoff):
+    attempt = 0
+    while True:
+        attempt += 1
+        _set_state(status="loading", attempts=attempt)
+        try:
+            t0 = time.perf_counter()
+            load_fn()
+            t1 = time.perf_counter()
+            if warmup_fn is not None:
+                _set_state(status="warming_up", load_seconds=round(t1 - t0, 3))
+                warmup_fn()
+            t2 = time.perf_counter()
+            _set_state(status="ready", error=None, load_seconds=round(t1 - t0, 3), warmup_seconds=round(t2 - t1, 3), ready_at=time.time())
+            print(f"Model ready after {attempt} attempt(s): load {t1 - t0:.1f}s, warm-up {t2 - t1:.1f}s")
+            return
+        except Exception as e:
+            print(f"Model loading warning (attempt {attempt}):", e)
+            if retries and attempt >= retries:
+                _set_state(status="failed", error=str(e))
+                return
+            _set_state(status="retrying", error=str(e))
+            time.sleep(min(MODEL_LOAD_MAX_BACKOFF, backoff * 2 ** (attempt - 1)))
+
+def start_background_load(load_fn=None, warmup_fn=None, retries=MODEL_LOAD_RETRIES, backoff=MODEL_LOAD_BACKOFF):
+    # the app serves requests immediately; prediction routes answer 503 until status is "ready"
+    global _loader
+    if _loader is None or not _loader.is_alive():
+        _loader = threading.Thread(
+            target=_load_forever,
+            args=(load_fn or load_model, warmup_fn, retries, backoff),
+            name="model-loader",
+            daemon=True,
+        )
+        _loader.start()
+    return _loader
+
+load_labels()
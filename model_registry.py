@@ -0,0 +1,298 @@
+# backend/model_registry.py
+# Every model the API can run: the general triage model plus optional per-crop
+# specialists, each with its own weights, labels and version. Models load on
+# first use and the least recently used ones are dropped once the estimated
+# resident size passes MODEL_MEMORY_BUDGET_MB.
+#
+# saved_model/models.json (optional; without it only "general" exists):
+#   {
+#     "general": {"path": "best_model.h5", "labels": "../labels.txt"},
+#     "tomato":  {"path": "tomato/model.h5", "labels": "tomato/labels.txt", "crop": "Tomato", "memory_mb": 300}
+#   }
+# Paths are relative to the manifest. "backend" ("keras" or "tflite") defaults
+# from the file extension; "version" defaults to the weights file's mtime and size.
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from backend.backends import INFERENCE_BACKEND, INFERENCE_THREADS, KERAS_MODEL_PATH, TFLITE_PATHS, SAVED_MODEL_DIR, KerasBackend, TFLiteBackend, load_backend
+from backend import metrics
+
+GENERAL = "general"
+MODEL_MANIFEST = os.environ.get("MODEL_MANIFEST", os.path.join(SAVED_MODEL_DIR, "models.json"))
+DEFAULT_LABELS_PATH = os.path.join(os.path.dirname(__file__), "labels.txt")
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "2048"))
+# resident size estimate for a model without memory_mb: weights file size times this
+MODEL_MEMORY_FACTOR = float(os.environ.get("MODEL_MEMORY_FACTOR", "3"))
+
+
+def read_labels(path):
+    if not path or not os.path.exists(path):
+        return ()
+    with open(path, "r") as f:
+        return tuple(l.strip() for l in f if l.strip())
+
+
+class ModelSpec:
+    def __init__(self, name, path, labels_path, crop=None, backend=None, memory_mb=None, version=None):
+        self.name = name
+        self.path = path
+        self.labels_path = labels_path
+        self.crop = crop
+        self.backend = backend or ("tflite" if path.endswith(".tflite") else "keras")
+        try:
+            st = os.stat(path)
+            size, mtime = st.st_size, int(st.st_mtime)
+        except OSError:
+            size, mtime = 0, 0
+        self.memory_bytes = int(memory_mb * 1024 * 1024) if memory_mb else int(size * MODEL_MEMORY_FACTOR)
+        self.version = version or f"{os.path.basename(path)}-{mtime}-{size}-{self.backend}"
+
+
+def _general_spec():
+    # the single-model layout this app started with; MODEL_VERSION still overrides the version.
+    # The version comes from the file the selected backend loads, so a regenerated .tflite counts as a new model
+    path = TFLITE_PATHS.get(INFERENCE_BACKEND, KERAS_MODEL_PATH)
+    return ModelSpec(GENERAL, path, DEFAULT_LABELS_PATH, backend=INFERENCE_BACKEND, version=os.environ.get("MODEL_VERSION"))
+
+
+def read_manifest(path=MODEL_MANIFEST):
+    specs = {GENERAL: _general_spec()}
+    if not path or not os.path.exists(path):
+        return specs
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r") as f:
+        for name, entry in json.load(f).items():
+            specs[name] = ModelSpec(
+                name,
+                os.path.join(base, entry["path"]),
+                os.path.join(base, entry["labels"]) if entry.get("labels") else None,
+                crop=entry.get("crop"),
+                backend=entry.get("backend"),
+                memory_mb=entry.get("memory_mb"),
+                version=entry.get("version"),
+            )
+    return specs
+
+
+class LoadedModel:
+    """
+    One resident version of one model. Immutable once built: a swap creates a
+    new LoadedModel, so a request that holds one keeps a consistent
+    backend/labels/version pair however long it runs.
+    """
+
+    def __init__(self, name, backend, labels, version, crop=None, memory_bytes=0):
+        self.name = name
+        self.backend = backend
+        self.labels = tuple(labels)
+        self.version = version
+        self.crop = crop
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+
+    @property
+    def key(self):
+        return f"{self.name}:{self.version}"
+
+    def predict(self, batch):
+        with metrics.timed("infer"):
+            return self.backend.predict(batch)
+
+
+def _load_backend(spec):
+    if spec.name == GENERAL and _worker_pool() is not None:
+        # the general model lives in the inference worker processes
+        return _worker_pool()
+    if not os.path.exists(spec.path) and not spec.backend.startswith("tflite-"):
+        raise RuntimeError(f"Model file not found at {spec.path}")
+    if spec.name == GENERAL:
+        return load_backend(spec.backend, keras_path=spec.path)
+    if spec.backend == "tflite":
+        return TFLiteBackend(spec.path, INFERENCE_THREADS, name="tflite")
+    return KerasBackend(spec.path, INFERENCE_THREADS)
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, LRU-evicted set of models. get() never holds the registry
+    lock while loading, and concurrent first requests for one model share a
+    single load. The general model is pinned (every prediction starts there).
+    Eviction and swap only drop the registry's reference; requests still
+    holding the old LoadedModel finish on it.
+    """
+
+    def __init__(self, manifest=MODEL_MANIFEST, budget_mb=MODEL_MEMORY_BUDGET_MB, loader=_load_backend):
+        self.manifest = manifest
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.loader = loader
+        self._specs = read_manifest(manifest)
+        self._resident = OrderedDict()  # name -> LoadedModel, least recently used first
+        self._loading = {}              # name -> lock held while that model loads
+        self._lock = threading.Lock()
+        self._on_swap = []
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+
+    def names(self):
+        with self._lock:
+            return list(self._specs)
+
+    def specialist_for(self, crop):
+        # name of the specialist model for a crop, or None
+        if not crop:
+            return None
+        crop = crop.lower()
+        with self._lock:
+            for name, spec in self._specs.items():
+                if name != GENERAL and spec.crop and spec.crop.lower() == crop:
+                    return name
+        return None
+
+    def version(self, name=GENERAL):
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None:
+                return entry.version
+            spec = self._specs.get(name)
+            return spec.version if spec else "unknown"
+
+    def versions(self):
+        # name -> current version for every known model
+        with self._lock:
+            return {n: (self._resident[n] if n in self._resident else self._specs[n]).version for n in self._specs}
+
+    def version_key(self):
+        # changes whenever any model that can answer a prediction changes
+        versions = sorted(self.versions().items())
+        return hashlib.sha1(json.dumps(versions).encode()).hexdigest()[:16]
+
+    def on_swap(self, fn):
+        # fn(new LoadedModel) whenever reload() or install() puts a model in place
+        self._on_swap.append(fn)
+
+    def resident(self, name):
+        # the loaded entry, or None; does not count as a use
+        with self._lock:
+            return self._resident.get(name)
+
+    def touch(self, name):
+        # the loaded entry marked most recently used, or None; never loads
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None:
+                self._resident.move_to_end(name)
+                self.hits += 1
+            return entry
+
+    def get(self, name=GENERAL):
+        entry = self.touch(name)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if name not in self._specs:
+                raise KeyError(f"Unknown model {name!r}")
+            load_lock = self._loading.setdefault(name, threading.Lock())
+        with load_lock:
+            entry = self.resident(name)
+            if entry is None:
+                entry = self._load(name)
+                self._admit(entry)
+        return entry
+
+    def _load(self, name, spec=None):
+        with self._lock:
+            spec = spec or self._specs[name]
+        with metrics.timed("model_load"):
+            backend = self.loader(spec)
+        labels = read_labels(spec.labels_path)
+        if not labels:
+            raise RuntimeError(f"No labels for model {name!r} ({spec.labels_path})")
+        print(f"Model registry: loaded {name} {spec.version}")
+        return LoadedModel(name, backend, labels, spec.version, crop=spec.crop, memory_bytes=spec.memory_bytes)
+
+    def _admit(self, entry):
+        with self._lock:
+            replaced = self._resident.pop(entry.name, None)
+            self._resident[entry.name] = entry
+            self.loads += 1
+            # evict least recently used specialists until the estimate fits
+            used = sum(e.memory_bytes for e in self._resident.values())
+            for name in list(self._resident):
+                if used <= self.budget:
+                    break
+                if name in (GENERAL, entry.name):
+                    continue
+                used -= self._resident.pop(name).memory_bytes
+                self.evictions += 1
+                print(f"Model registry: evicted {name}")
+        return replaced
+
+    def install(self, name, backend, labels, version, crop=None, memory_bytes=0):
+        # put an already-built backend in place (benchmarks, tests)
+        entry = LoadedModel(name, backend, labels, version, crop=crop, memory_bytes=memory_bytes)
+        with self._lock:
+            if name not in self._specs:
+                self._specs[name] = ModelSpec(name, "", None, crop=crop, version=version)
+        self._swap_in(entry)
+        return entry
+
+    def _swap_in(self, entry):
+        if self._admit(entry) is not None:
+            self.swaps += 1
+        for fn in self._on_swap:
+            fn(entry)
+
+    def reload(self, names=None):
+        """
+        Re-read the manifest and hot-swap every resident model whose version
+        changed. The new version is loaded next to the old one, then replaces
+        it in a single step. Returns the names swapped.
+        """
+        specs = read_manifest(self.manifest)
+        swapped = []
+        for name, spec in specs.items():
+            if names and name not in names:
+                continue
+            current = self.resident(name)
+            if current is not None and current.version != spec.version:
+                if name == GENERAL and current.backend is _worker_pool():
+                    raise RuntimeError("The general model runs in inference workers; restart to change it")
+                entry = self._load(name, spec)
+                with self._lock:
+                    self._specs[name] = spec
+                self._swap_in(entry)
+                swapped.append(name)
+        with self._lock:
+            # new or removed specialists; resident ones that left the manifest stay until evicted
+            for name, spec in specs.items():
+                if name not in swapped:
+                    self._specs[name] = spec
+        return swapped
+
+    def stats(self):
+        with self._lock:
+            resident = [
+                {"name": e.name, "version": e.version, "crop": e.crop, "memory_mb": round(e.memory_bytes / 2 ** 20, 1), "loaded_at": e.loaded_at}
+                for e in self._resident.values()
+            ]
+            return {
+                "models": sorted(self._specs),
+                "resident": resident,
+                "resident_mb": round(sum(e.memory_bytes for e in self._resident.values()) / 2 ** 20, 1),
+                "budget_mb": round(self.budget / 2 ** 20, 1),
+                "hits": self.hits, "loads": self.loads, "evictions": self.evictions, "swaps": self.swaps,
+            }
+
+
+def _worker_pool():
+    from backend import worker_pool
+    return worker_pool.pool
+
+
+registry = ModelRegistry()
@@ -2,7 +2,41 @@
 import streamlit as st
 from PIL import Image, ImageOps
 import io
-from pages.assets.utils import predict_pil_image
+import time
+from pages.assets.utils import predict_pil_image, LiveStream
+
+def _live_stream():
+    # one connection per browser session, reopened if the backend dropped it
+    live = st.session_state.get("live_stream")
+    if live is None or not live.connected:
+        live = st.session_state["live_stream"] = LiveStream(top_k=3)
+        st.session_state["live_frames_sent"] = 0
+    return live
+
+def _continuous_scan(img):
+    try:
+        live = _live_stream()
+    except ImportError:
+        st.error("Continuous scan needs the websocket-client package (pip install websocket-client).")
+        return
+    except Exception as e:
+        st.error(f"Could not connect to the live feed: {e}")
+        return
+    live.send_frame(img)
+    st.session_state["live_frames_sent"] += 1
+    sent = st.session_state["live_frames_sent"]
+    deadline = time.time() + 5
+    while live.connected and time.time() < deadline and (live.result is None or live.result["frame"] < sent):
+        time.sleep(0.05)
+    out = live.result
+    if live.error:
+        st.error(f"Live feed: {live.error}")
+    if out:
+        st.caption(f"Smoothed over recent captures · frame {out['frame']} · {out['latency_ms']} ms")
+        for p in out["top_k"]:
+            st.write(f"• {p['label']} — {p['confidence']*100:.1f}%")
+    if st.button("Next plant (reset smoothing)"):
+        live.reset()
 
 def app():
     st.markdown('<div id="live"></div>', unsafe_allow_html=True)
@@ -19,6 +53,9 @@ def app():
         elif mode == "Rotate 180°":
             img = img.rotate(180, expand=True)
         st.image(img, caption="Captured", use_column_width=True)
+        if st.checkbox("Continuous scan", help="Keep a live connection open and average predictions across captures while you walk a row."):
+            _continuous_scan(img)
+            return
         col1, col2 = st.columns([1,1])
         with col1:
             if st.button("Predict from capture"):
@@ -6,12 +6,24 @@ def app():
     st.markdown('<div id="admin"></div>', unsafe_allow_html=True)
     st.title("Admin")
     token = st.text_input("Admin token", type="password")
+    col1, col2, col3 = st.columns(3)
+    since = col1.date_input("From", value=None)
+    until = col2.date_input("Until (exclusive)", value=None)
+    granularity = col3.selectbox("Granularity", ["day", "hour"])
     if st.button("Get stats"):
         if not token:
             st.error("Admin token required")
             return
         try:
-            data = get_admin_stats(token)
+            data = get_admin_stats(
+                token,
+                since=since.isoformat() if since else None,
+                until=until.isoformat() if until else None,
+                granularity=granularity
+            )
+            st.metric("Total scans", data.get("total_scans", 0))
+            if data.get("series"):
+                st.bar_chart({p["bucket"]: p["count"] for p in data["series"]})
             st.json(data)
         except Exception as e:
             st.error(f"Failed: {e}")
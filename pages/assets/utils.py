@@ -3,40 +3,194 @@ import os
 import requests
 import json
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
 import base64
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:8000")
 OPENAI_KEY = os.environ.get("OPENAI_API_KEY")  # optional
+# uploads are shrunk so the shorter side is at most this; the model sees 224x224 and
+# reports/thumbnails use up to 512, so nothing downstream needs more
+UPLOAD_SHORT_SIDE = int(os.environ.get("UPLOAD_SHORT_SIDE", "512"))
+UPLOAD_JPEG_QUALITY = int(os.environ.get("UPLOAD_JPEG_QUALITY", "85"))
+# seconds cached reads stay fresh; a new prediction clears them early
+HISTORY_TTL = 30
+SCAN_TTL = 300
+STATS_TTL = 60
+
+_session = None
+
+def get_session():
+    # one keep-alive connection pool for every helper; idempotent GETs retry on gateway errors
+    global _session
+    if _session is None:
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+def encode_for_upload(pil_img, short_side=UPLOAD_SHORT_SIDE, quality=UPLOAD_JPEG_QUALITY):
+    # JPEG bytes scaled down (never up) keeping the aspect ratio; EXIF rotation is applied first
+    img = ImageOps.exif_transpose(pil_img).convert("RGB")
+    w, h = img.size
+    scale = short_side / min(w, h)
+    if scale < 1:
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS, reducing_gap=3.0)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def downscale_image_bytes(data, short_side=UPLOAD_SHORT_SIDE):
+    # re-encode only when that makes the upload smaller; anything PIL can't open (e.g. a ZIP) passes through
+    try:
+        img = Image.open(BytesIO(data))
+        img.draft("RGB", (short_side, short_side))
+        small = encode_for_upload(img, short_side)
+    except Exception:
+        return data
+    return small if len(small) < len(data) else data
+
+def invalidate_reads():
+    # a new scan changes history and stats; drop cached copies so the next view is current
+    get_history.clear()
+    get_admin_stats.clear()
 
 def predict_image_bytes(image_bytes, timeout=30):
     url = f"{BACKEND_URL}/predict"
     files = {"file": ("img.jpg", image_bytes, "image/jpeg")}
-    r = requests.post(url, files=files, timeout=timeout)
+    r = get_session().post(url, files=files, timeout=timeout)
     r.raise_for_status()
+    invalidate_reads()
     return r.json()
 
 def predict_pil_image(pil_img):
-    buf = BytesIO()
-    pil_img.save(buf, format="JPEG")
-    buf.seek(0)
-    return predict_image_bytes(buf.getvalue())
+    return predict_image_bytes(encode_for_upload(pil_img))
+
+class LiveStream:
+    """
+    Persistent connection to /ws/predict_live for continuous scanning. send_frame()
+    returns immediately; the backend infers only the newest frame and a reader
+    thread keeps the latest smoothed result in .result. Needs the websocket-client
+    package (imported on first use).
+    """
+
+    def __init__(self, top_k=3, alpha=None, timeout=10):
+        import threading
+        from urllib.parse import urlencode
+        import websocket  # websocket-client
 
-def get_history(limit=200):
+        params = {"top_k": top_k}
+        if alpha is not None:
+            params["alpha"] = alpha
+        base = BACKEND_URL.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        self._ws = websocket.create_connection(f"{base}/ws/predict_live?{urlencode(params)}", timeout=timeout)
+        self._ws.settimeout(None)
+        self._lock = threading.Lock()
+        self.result = None
+        self.error = None
+        self.connected = True
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                msg = self._ws.recv()
+                if not msg:
+                    break
+                data = json.loads(msg)
+                if "error" in data and "top_k" not in data:
+                    self.error = data["error"]
+                else:
+                    self.result = data
+        except Exception as e:
+            if self.connected:
+                self.error = str(e)
+        finally:
+            self.connected = False
+
+    def send_frame(self, frame, quality=80):
+        # frame: PIL image or encoded image bytes
+        if not isinstance(frame, (bytes, bytearray)):
+            frame = encode_for_upload(frame, quality=quality)
+        with self._lock:
+            self._ws.send_binary(frame)
+
+    def reset(self):
+        # restart smoothing, e.g. when moving on to the next plant
+        with self._lock:
+            self._ws.send(json.dumps({"reset": True}))
+
+    def close(self):
+        self.connected = False
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def predict_batch_files(named_images, timeout=300):
+    # named_images: [(filename, bytes)]; yields one result per image as the backend streams them
+    url = f"{BACKEND_URL}/predict_batch"
+    files = [("files", (name, downscale_image_bytes(data), "application/octet-stream")) for name, data in named_images]
+    try:
+        with get_session().post(url, files=files, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
+    finally:
+        invalidate_reads()
+
+@st.cache_data(ttl=HISTORY_TTL, show_spinner=False)
+def get_history(limit=50, cursor=None, **filters):
+    # returns {"scans": [...], "next_cursor": ...}; filters: crop, label, min_confidence, max_confidence, since, until
     url = f"{BACKEND_URL}/history"
-    r = requests.get(url, params={"limit": limit}, timeout=10)
+    params = {"limit": limit, "cursor": cursor}
+    params.update({k: v for k, v in filters.items() if v not in (None, "")})
+    r = get_session().get(url, params=params, timeout=10)
     r.raise_for_status()
     return r.json()
 
+@st.cache_data(ttl=SCAN_TTL, show_spinner=False)
 def get_scan(scan_id):
     url = f"{BACKEND_URL}/scan/{scan_id}"
-    r = requests.get(url, timeout=10)
+    r = get_session().get(url, timeout=10)
     r.raise_for_status()
     return r.json()
 
-def get_admin_stats(token):
+# (scan_id, size) -> (etag, bytes); revalidated with If-None-Match so repeat views cost a 304
+_THUMBS = {}
+_THUMBS_MAX = 512
+
+def get_thumbnail(scan_id, size="sm"):
+    url = f"{BACKEND_URL}/scan/{scan_id}/thumbnail"
+    cached = _THUMBS.get((scan_id, size))
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    r = get_session().get(url, params={"size": size}, headers=headers, timeout=10)
+    if r.status_code == 304 and cached:
+        return cached[1]
+    r.raise_for_status()
+    if len(_THUMBS) >= _THUMBS_MAX:
+        _THUMBS.pop(next(iter(_THUMBS)))
+    _THUMBS[(scan_id, size)] = (r.headers.get("ETag"), r.content)
+    return r.content
+
+@st.cache_data(ttl=STATS_TTL, show_spinner=False)
+def get_admin_stats(token, since=None, until=None, granularity="day"):
     url = f"{BACKEND_URL}/admin/stats"
-    r = requests.get(url, params={"token": token}, timeout=10)
+    params = {"token": token, "since": since, "until": until, "granularity": granularity}
+    r = get_session().get(url, params=params, timeout=10)
     r.raise_for_status()
     return r.json()
 
@@ -2,17 +2,21 @@
 import streamlit as st
 from PIL import Image
 import io
-from pages.assets.utils import predict_pil_image
+from pages.assets.utils import predict_pil_image, predict_batch_files
 
 def app():
     st.markdown('<div id="detect"></div>', unsafe_allow_html=True)
     st.title("Detect — Upload Image")
     st.write("Upload a leaf/crop image. The backend model will return top predictions and recommendations.")
 
-    uploaded = st.file_uploader("Upload image (jpg, png)", type=["jpg","jpeg","png"])
-    if not uploaded:
+    uploaded_files = st.file_uploader("Upload image (jpg, png) or a ZIP of images", type=["jpg","jpeg","png","zip"], accept_multiple_files=True)
+    if not uploaded_files:
         st.info("Upload a photo or use Live Camera.")
         return
+    if len(uploaded_files) > 1 or uploaded_files[0].name.lower().endswith(".zip"):
+        batch_app(uploaded_files)
+        return
+    uploaded = uploaded_files[0]
 
     try:
         img = Image.open(uploaded).convert("RGB")
@@ -44,3 +48,27 @@ def app():
                 st.download_button("Download prediction (JSON)", data=str(out), file_name="prediction.json")
             except Exception as e:
                 st.error(f"Prediction error: {e}")
+
+
+def batch_app(uploaded_files):
+    st.write(f"{len(uploaded_files)} file(s) selected.")
+    if not st.button("Predict all"):
+        return
+    rows = []
+    table = st.empty()
+    with st.spinner("Contacting backend..."):
+        try:
+            for out in predict_batch_files([(f.name, f.getvalue()) for f in uploaded_files]):
+                top = (out.get("top_k") or [{}])[0]
+                rows.append({
+                    "file": out.get("filename"),
+                    "label": top.get("label"),
+                    "confidence": round(top.get("confidence", 0) * 100, 1) if top else None,
+                    "scan_id": out.get("scan_id"),
+                    "error": out.get("error")
+                })
+                table.table(rows)
+            st.success(f"Processed {len(rows)} image(s)")
+            st.session_state["last_predict"] = rows
+        except Exception as e:
+            st.error(f"Prediction error: {e}")
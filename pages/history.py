@@ -1,19 +1,63 @@
 # frontend/pages/history.py
 import streamlit as st
-from pages.assets.utils import get_history
+from pages.assets.utils import get_history, get_thumbnail
+
+PAGE_SIZE = 25
+GRID_COLUMNS = 5
 
 def app():
     st.markdown('<div id="history"></div>', unsafe_allow_html=True)
     st.title("History — Past Scans")
     st.write("List of recent scans saved on the backend (if DB enabled).")
 
+    with st.expander("Filters"):
+        col1, col2 = st.columns(2)
+        crop = col1.text_input("Crop")
+        label = col2.text_input("Disease label")
+        min_conf, max_conf = st.slider("Confidence (%)", 0, 100, (0, 100))
+        since = col1.date_input("From", value=None)
+        until = col2.date_input("Until (exclusive)", value=None)
+    filters = {
+        "crop": crop,
+        "label": label,
+        "min_confidence": min_conf / 100 if min_conf > 0 else None,
+        "max_confidence": max_conf / 100 if max_conf < 100 else None,
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+    }
+
+    # cursors of the pages visited so far; reset whenever the filters change
+    if st.session_state.get("history_filters") != filters:
+        st.session_state["history_filters"] = filters
+        st.session_state["history_cursors"] = [None]
+    cursors = st.session_state["history_cursors"]
+
     try:
-        rows = get_history(limit=200)
-        if not rows:
-            st.info("No scans yet.")
-            return
-        for s in rows:
-            with st.expander(f"Scan {s['id']} — {s.get('label')}"):
-                st.json(s)
+        page = get_history(limit=PAGE_SIZE, cursor=cursors[-1], **filters)
     except Exception as e:
         st.error(f"Could not retrieve history: {e}")
+        return
+
+    rows = page.get("scans", [])
+    if not rows:
+        st.info("No scans yet.")
+    show_thumbs = st.checkbox("Show images", value=True)
+    for start in range(0, len(rows), GRID_COLUMNS):
+        cols = st.columns(GRID_COLUMNS)
+        for col, s in zip(cols, rows[start:start + GRID_COLUMNS]):
+            with col:
+                if show_thumbs:
+                    try:
+                        st.image(get_thumbnail(s["id"], "sm"), use_column_width=True)
+                    except Exception:
+                        st.caption("(no image)")
+                conf = f" {s['confidence']*100:.0f}%" if s.get("confidence") is not None else ""
+                st.caption(f"#{s['id']} {s.get('label')}{conf}")
+                with st.expander("Details"):
+                    st.json(s)
+
+    # callbacks run before the next script run, so that run already fetches the new page
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    col_prev.button("← Newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+    col_page.write(f"Page {len(cursors)}")
+    col_next.button("Older →", disabled=not page.get("next_cursor"), on_click=cursors.append, args=(page.get("next_cursor"),))
@@ -0,0 +1,80 @@
+# backend/parity.py
+# Compare inference backends against the Keras model on a directory of images.
+#   python -m backend.parity images/ --backends tflite-fp16,tflite-int8
+import json
+import time
+import argparse
+
+import numpy as np
+
+from backend.backends import load_backend, INFERENCE_THREADS
+from backend.convert_tflite import iter_image_paths
+from backend.preprocess import preprocess_batch
+
+
+def load_batches(paths, batch_size):
+    for i in range(0, len(paths), batch_size):
+        chunk = paths[i:i + batch_size]
+        data = []
+        for path in chunk:
+            with open(path, "rb") as f:
+                data.append(f.read())
+        batch, errors = preprocess_batch(data)
+        keep = [j for j, e in enumerate(errors) if e is None]
+        yield batch[keep]
+
+
+def run(backend, batches):
+    outputs, elapsed = [], 0.0
+    for batch in batches:
+        t0 = time.perf_counter()
+        outputs.append(backend.predict(batch))
+        elapsed += time.perf_counter() - t0
+    return np.concatenate(outputs), elapsed
+
+
+def compare(reference, candidate):
+    ref_top = reference.argmax(axis=1)
+    cand_top = candidate.argmax(axis=1)
+    rows = np.arange(len(reference))
+    # drift of the confidence the reference model gave its own top-1 class
+    drift = np.abs(candidate[rows, ref_top] - reference[rows, ref_top])
+    return {
+        "top1_agreement": round(float((ref_top == cand_top).mean()), 4),
+        "mean_confidence_drift": round(float(drift.mean()), 5),
+        "max_confidence_drift": round(float(drift.max()), 5),
+        "max_abs_score_diff": round(float(np.abs(candidate - reference).max()), 5),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Top-1 agreement and confidence drift of backends vs. Keras")
+    ap.add_argument("image_dir")
+    ap.add_argument("--backends", default="tflite-fp16,tflite-int8")
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--threads", type=int, default=INFERENCE_THREADS)
+    ap.add_argument("--limit", type=int, default=0, help="use at most this many images (0 = all)")
+    args = ap.parse_args()
+
+    paths = list(iter_image_paths(args.image_dir))
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        ap.error(f"no images found in {args.image_dir}")
+    # decode once; every backend sees identical tensors
+    batches = list(load_batches(paths, args.batch_size))
+    n = sum(len(b) for b in batches)
+
+    reference, ref_time = run(load_backend("keras", args.threads), batches)
+    report = {"images": n, "keras_ms_per_image": round(ref_time / n * 1000, 3), "backends": {}}
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        scores, elapsed = run(load_backend(name, args.threads), batches)
+        result = compare(reference, scores)
+        result["ms_per_image"] = round(elapsed / n * 1000, 3)
+        result["speedup_vs_keras"] = round(ref_time / elapsed, 2) if elapsed else None
+        report["backends"][name] = result
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# backend/places.py
+import os
+import time
+import asyncio
+from collections import OrderedDict
+
+import httpx
+
+# point at a local mock server for benchmarks
+PLACES_BASE_URL = os.environ.get("PLACES_BASE_URL", "https://maps.googleapis.com/maps/api/place")
+PLACES_TIMEOUT = float(os.environ.get("PLACES_TIMEOUT", "5"))
+PLACES_RETRIES = int(os.environ.get("PLACES_RETRIES", "2"))
+PLACES_MAX_CONNECTIONS = int(os.environ.get("PLACES_MAX_CONNECTIONS", "20"))
+PLACES_CACHE_TTL = float(os.environ.get("PLACES_CACHE_TTL", "3600"))
+PLACES_CACHE_SIZE = int(os.environ.get("PLACES_CACHE_SIZE", "4096"))
+# tile edge in degrees; 0.01° is about 1.1 km, so one village shares a tile
+PLACES_TILE_DEG = float(os.environ.get("PLACES_TILE_DEG", "0.01"))
+
+
+class PlacesError(Exception):
+    pass
+
+
+class PlacesClient:
+    """
+    Nearby-search client with one pooled async HTTP connection, timeouts and
+    retries. Results are cached per (geo tile, radius, query) with a TTL, and
+    concurrent lookups for the same key share one upstream request.
+    """
+
+    def __init__(self, api_key, base_url=PLACES_BASE_URL, timeout=PLACES_TIMEOUT, retries=PLACES_RETRIES,
+                 ttl=PLACES_CACHE_TTL, max_entries=PLACES_CACHE_SIZE, tile_deg=PLACES_TILE_DEG, transport=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tile_deg = tile_deg
+        self._transport = transport
+        self._client = None
+        self._cache = OrderedDict()  # key -> (expires_at, places)
+        self._inflight = {}          # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=PLACES_MAX_CONNECTIONS, max_keepalive_connections=PLACES_MAX_CONNECTIONS),
+                transport=self._transport,
+            )
+        return self._client
+
+    def tile_key(self, lat, lon, radius, query):
+        return (round(lat / self.tile_deg), round(lon / self.tile_deg), int(radius), query.strip().lower())
+
+    async def nearby(self, lat, lon, radius, query):
+        key = self.tile_key(lat, lon, radius, query)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._fetch_and_store(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: one caller disconnecting must not cancel the shared request
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key):
+        tile_lat, tile_lon, radius, query = key
+        # query from the tile centre so every caller in the tile gets the same answer
+        places = await self._fetch(round(tile_lat * self.tile_deg, 6), round(tile_lon * self.tile_deg, 6), radius, query)
+        self._cache[key] = (time.monotonic() + self.ttl, places)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return places
+
+    async def _fetch(self, lat, lon, radius, query):
+        params = {"location": f"{lat},{lon}", "radius": radius, "keyword": query, "key": self.api_key}
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(0.2 * 2 ** (attempt - 1))
+            try:
+                self.upstream_calls += 1
+                resp = await self._get_client().get("/nearbysearch/json", params=params)
+                if resp.status_code >= 500:
+                    last_error = PlacesError(f"Places API returned HTTP {resp.status_code}")
+                    continue
+                resp.raise_for_status()
+                data = resp.json()
+                if not isinstance(data, dict):
+                    raise ValueError(f"expected an object, got {type(data).__name__}")
+            except httpx.TransportError as e:
+                last_error = PlacesError(f"Places API unreachable: {e!r}")
+                continue
+            except ValueError as e:
+                # a 200 with a body that is not Places JSON (proxy or captive-portal page); retried like a 5xx
+                last_error = PlacesError(f"Places API returned an invalid response: {e}")
+                continue
+            except httpx.HTTPStatusError as e:
+                raise PlacesError(f"Places API returned HTTP {e.response.status_code}")
+            status = data.get("status", "OK")
+            if status not in ("OK", "ZERO_RESULTS"):
+                raise PlacesError(f"Places API error: {status} {data.get('error_message', '')}".strip())
+            return [{"name": p.get("name"), "vicinity": p.get("vicinity")} for p in data.get("results", [])]
+        raise last_error
+
+    def stats(self):
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses,
+                "upstream_calls": self.upstream_calls, "inflight": len(self._inflight)}
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
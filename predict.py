@@ -1,7 +1,10 @@
 # backend/predict.py
+import re
 import numpy as np
-from backend.model_loader import model, labels
-from backend.preprocess import preprocess_image
+from backend.model_loader import labels, get_model
+from backend.model_registry import registry, GENERAL
+from backend.preprocess import preprocess_image, IMG_SIZE
+from backend import worker_pool, metrics
 import json
 import os
 
@@ -10,25 +13,94 @@ RECOMMEND_FILE = os.path.join(os.path.dirname(__file__), "recommendations.json")
 with open(RECOMMEND_FILE, "r") as f:
     MEDICINES = json.load(f)
 
+# batch sizes traced during start-up so the first real requests don't pay for it
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get("WARMUP_BATCH_SIZES", f"1,{os.environ.get('BATCH_MAX_SIZE', '8')}").split(",") if n.strip()]
+
+
+def predict_batch(batch):
+    # batch is a preprocessed (N, 224, 224, 3) array; returns (N, num_classes) scores
+    with metrics.timed("infer"):
+        if worker_pool.pool is not None:
+            return worker_pool.pool.predict(batch)
+        return get_model().predict(batch)
+
+
+def warm_up(batch_sizes=WARMUP_BATCH_SIZES):
+    if worker_pool.pool is not None:
+        worker_pool.pool.warm_up(batch_sizes)
+        return
+    for n in batch_sizes:
+        predict_batch(np.zeros((n, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+
+
+def crop_of(label):
+    # "Tomato___Early_blight" -> "Tomato", "TomatoEarlyBlight" -> "Tomato"
+    if "_" in label:
+        return label.split("_")[0]
+    match = re.match(r"[A-Z]?[a-z]+", label)
+    return match.group(0) if match else label
 
-def single_predict(image_bytes, top_k=3):
-    img = preprocess_image(image_bytes)
 
-    preds = model.predict(img)[0]
+def format_predictions(preds, top_k=3, model=None):
+    # model: the model_registry.LoadedModel that produced preds; defaults to the general labels
+    names = model.labels if model is not None else labels
     sorted_idx = np.argsort(preds)[::-1][:top_k]
 
     results = []
     for idx in sorted_idx:
-        label = labels[idx]
+        label = names[idx]
         results.append({
             "label": label,
             "confidence": float(preds[idx]),
             "treatment": MEDICINES.get(label, "No treatment available")
         })
 
-    crop = labels[sorted_idx[0]].split("_")[0]
+    # a specialist's labels need not carry the crop name
+    crop = model.crop if model is not None and model.crop else crop_of(names[sorted_idx[0]])
 
-    return {
+    result = {
         "crop": crop,
         "top_k": results
     }
+    if model is not None:
+        result["model"] = model.name
+        result["model_version"] = model.version
+    return result
+
+
+def route(general_result, specialist, preds, top_k=3):
+    # specialist result for an image the general model triaged, keeping the triage call
+    result = format_predictions(preds, top_k=top_k, model=specialist)
+    top = general_result["top_k"][0]
+    result["triage"] = {"model": general_result.get("model"), "label": top["label"], "confidence": top["confidence"]}
+    return result
+
+
+def predict_routed(batch, top_k=3):
+    """
+    Run a preprocessed batch through the general model, then re-run each image
+    whose crop has a specialist through that specialist (one call per crop).
+    A specialist that fails to load leaves the general result in place.
+    """
+    general = registry.get(GENERAL)
+    results = [format_predictions(p, top_k=top_k, model=general) for p in general.predict(batch)]
+    by_model = {}
+    for i, r in enumerate(results):
+        name = registry.specialist_for(r["crop"])
+        if name:
+            by_model.setdefault(name, []).append(i)
+    for name, rows in by_model.items():
+        try:
+            specialist = registry.get(name)
+            preds = specialist.predict(batch[rows])
+        except Exception as e:
+            print(f"Specialist {name} unavailable, keeping general predictions:", e)
+            continue
+        for i, p in zip(rows, preds):
+            results[i] = route(results[i], specialist, p, top_k)
+    return results
+
+
+def single_predict(image_bytes, top_k=3):
+    img = preprocess_image(image_bytes)
+    return predict_routed(img, top_k=top_k)[0]
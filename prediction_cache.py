@@ -0,0 +1,123 @@
+# backend/prediction_cache.py
+import os
+import json
+import time
+import hashlib
+import shutil
+import threading
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+# optional on-disk tier that survives restarts; off unless set
+PREDICTION_CACHE_DIR = os.environ.get("PREDICTION_CACHE_DIR")
+
+
+def image_digest(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def cache_key(digest, version):
+    # digest: sha256 hex of the uploaded bytes
+    return hashlib.sha256(f"{version}:{digest}".encode()).hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache of prediction results keyed on image hash and model version.
+    Memory holds at most max_entries results; the optional disk tier stores one
+    JSON file per key (sharded by hash prefix) and uses file mtime for the TTL.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL, disk_dir=PREDICTION_CACHE_DIR):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl)
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _get_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _put_disk(self, key, result):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+
+    def _put_memory(self, key, result):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+        result = self._get_disk(key) if self.disk_dir else None
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, result)
+        return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._put_memory(key, result)
+        if self.disk_dir:
+            try:
+                self._put_disk(key, result)
+            except OSError as e:
+                print("Prediction cache disk write failed:", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir:
+            shutil.rmtree(self.disk_dir, ignore_errors=True)
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
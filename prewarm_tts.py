@@ -0,0 +1,49 @@
+# backend/prewarm_tts.py
+# Synthesize every recommendation text into the TTS cache ahead of time.
+#   python -m backend.prewarm_tts [--langs en,hi] [--workers 4]
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.tts_cache import tts_cache, TTS_LANGUAGES
+
+# same file predict.py reads; not imported from there to avoid loading the model
+RECOMMEND_FILE = os.path.join(os.path.dirname(__file__), "recommendations.json")
+
+
+def recommendation_texts():
+    with open(RECOMMEND_FILE, "r") as f:
+        recs = json.load(f)
+    texts = []
+    for entry in recs.values():
+        text = entry.get("treatment") if isinstance(entry, dict) else entry
+        if text and text not in texts:
+            texts.append(text)
+    return texts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pre-warm the TTS cache with recommendation texts")
+    ap.add_argument("--langs", default=",".join(TTS_LANGUAGES))
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    jobs = [(text, lang.strip()) for lang in args.langs.split(",") if lang.strip() for text in recommendation_texts()]
+
+    def work(job):
+        try:
+            tts_cache.get_path(*job)
+            return None
+        except Exception as e:
+            return f"{job[1]}: {job[0][:40]}... failed: {e}"
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        errors = [e for e in pool.map(work, jobs) if e]
+    for e in errors:
+        print(e)
+    print(f"warmed {len(jobs) - len(errors)}/{len(jobs)} entries; cache {tts_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# backend/rebuild_stats.py
+# Recompute the scan_stats counters from the scans table.
+#   python -m backend.rebuild_stats
+from backend.db import SessionLocal
+from backend.crud import Scan  # noqa: F401  (registers the scans table)
+from backend.stats import rebuild_stats
+
+
+def main():
+    db = SessionLocal()
+    try:
+        print(f"rebuilt {rebuild_stats(db)} counters")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,134 @@
 # backend/report_generator.py
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
-import base64
+from reportlab.lib.utils import ImageReader
 from PIL import Image
 import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from backend.crud import load_scan_image
+from backend.thumbnails import thumbnail_store
 
-def generate_pdf_report(scan, out_path):
-    c = canvas.Canvas(out_path, pagesize=letter)
+REPORT_CACHE_BYTES = int(os.environ.get("REPORT_CACHE_BYTES", str(64 * 1024 * 1024)))
+REPORT_IMAGE_SIZE = 250
+# smallest precomputed thumbnail that covers REPORT_IMAGE_SIZE
+REPORT_THUMB_SIZE = "md"
+
+
+def report_fingerprint(scan):
+    # changes whenever anything printed on the report changes
+    parts = [scan.id, scan.timestamp, scan.crop, scan.top_label, scan.confidence,
+             scan.treatment, scan.notes, scan.geo, scan.image_path]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _report_image(scan):
+    # the precomputed thumbnail is already report-sized; only legacy rows decode the original
+    if scan.image_path:
+        path = thumbnail_store.get_path(scan.image_path, REPORT_THUMB_SIZE, load=lambda: load_scan_image(scan))
+        if path:
+            return ImageReader(path)
+    img_data = load_scan_image(scan)
+    if not img_data:
+        return None
+    img = Image.open(io.BytesIO(img_data))
+    img.draft("RGB", (REPORT_IMAGE_SIZE, REPORT_IMAGE_SIZE))
+    img = img.convert("RGB").resize((REPORT_IMAGE_SIZE, REPORT_IMAGE_SIZE))
+    return ImageReader(img)
+
+
+def render_pdf_report(scan):
+    # returns the PDF as bytes; nothing touches the filesystem
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
 
     c.setFont("Helvetica-Bold", 18)
     c.drawString(50, 750, "Crop Disease Detection Report")
 
     c.setFont("Helvetica", 12)
 
+    confidence = round(scan.confidence * 100, 2) if scan.confidence is not None else "n/a"
     c.drawString(50, 720, f"Scan ID: {scan.id}")
     c.drawString(50, 700, f"Crop: {scan.crop}")
     c.drawString(50, 680, f"Disease: {scan.top_label}")
-    c.drawString(50, 660, f"Confidence: {round(scan.confidence*100, 2)}%")
+    c.drawString(50, 660, f"Confidence: {confidence}%")
     c.drawString(50, 640, f"Treatment: {scan.treatment}")
     c.drawString(50, 620, f"Notes: {scan.notes}")
     c.drawString(50, 600, f"Location: {scan.geo}")
 
-    # Decode stored base64 image
-    img_data = base64.b64decode(scan.image_base64)
-    img = Image.open(io.BytesIO(img_data))
-    img = img.resize((250, 250))
+    image = _report_image(scan)
+    if image is not None:
+        c.drawImage(image, 50, 330, width=REPORT_IMAGE_SIZE, height=REPORT_IMAGE_SIZE, preserveAspectRatio=True, anchor="sw")
 
-    img_path = out_path.replace(".pdf", ".jpg")
-    img.save(img_path)
+    c.save()
+    return buf.getvalue()
 
-    c.drawImage(img_path, 50, 330, width=250, height=250)
 
-    c.save()
+def generate_pdf_report(scan, out_path):
+    with open(out_path, "wb") as f:
+        f.write(render_pdf_report(scan))
+
+
+class ReportCache:
+    """
+    Rendered PDFs keyed by scan id, bounded by total size (LRU). Each entry
+    remembers the fingerprint of the scan it was rendered from, so an edited
+    scan misses instead of serving a stale report.
+    """
+
+    def __init__(self, max_bytes=REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # scan_id -> (fingerprint, pdf)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scan_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get(scan_id)
+            if entry is None or entry[0] != fingerprint:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(scan_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, scan_id, fingerprint, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(scan_id)
+            self._entries[scan_id] = (fingerprint, pdf)
+            self._size += len(pdf)
+            while self._size > self.max_bytes:
+                _, (_, old) = self._entries.popitem(last=False)
+                self._size -= len(old)
+
+    def _drop(self, scan_id):
+        entry = self._entries.pop(scan_id, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def invalidate(self, scan_id):
+        with self._lock:
+            self._drop(scan_id)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+report_cache = ReportCache()
+
+
+def get_pdf_report(scan):
+    fingerprint = report_fingerprint(scan)
+    pdf = report_cache.get(scan.id, fingerprint)
+    if pdf is None:
+        pdf = render_pdf_report(scan)
+        report_cache.put(scan.id, fingerprint, pdf)
+    return pdf, fingerprint
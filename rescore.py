@@ -0,0 +1,240 @@
+# backend/rescore.py
+# Re-run stored scans through the current models after saved_model/best_model.h5
+# (or a specialist in models.json) is replaced, updating top_label/confidence/
+# crop/treatment and model_version. Images are routed to crop specialists the
+# same way /predict does.
+#   python -m backend.rescore [--chunk-size 512] [--batch-size 64] [--workers N]
+#                             [--checkpoint rescore_checkpoint.json] [--report rescore_report] [--dry-run]
+# Progress is checkpointed after every committed chunk; re-running the same
+# command resumes. Label changes go to <report>.csv (one row per changed scan)
+# and <report>.json (transition counts).
+import os
+import csv
+import json
+import time
+import base64
+import argparse
+import multiprocessing as mp
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import update, or_
+
+from backend.db import SessionLocal
+from backend.crud import Scan
+from backend.blob_store import blob_store
+from backend.model_loader import load_model
+from backend.model_registry import registry
+from backend.predict import predict_routed
+from backend.preprocess import IMG_SIZE, _SCALE, _load_fast
+from backend.stats import record_scans
+
+RESCORE_WORKERS = int(os.environ.get("RESCORE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+
+def _decode(task):
+    # runs in a pool process: (image_path, legacy base64) -> uint8 (IMG_SIZE, IMG_SIZE, 3), or an error string.
+    # uint8 is a quarter of the float32 size to send back; scaling happens in the parent.
+    image_path, image_base64 = task
+    try:
+        if image_path and blob_store.exists(image_path):
+            data = blob_store.get(image_path)
+        elif image_base64:
+            data = base64.b64decode(image_base64)
+        else:
+            return "image missing"
+        return np.asarray(_load_fast(data), dtype=np.uint8)
+    except Exception as e:
+        return f"decode failed: {e}"
+
+
+def _treatment_text(treatment):
+    # same encoding as crud._new_scan
+    return json.dumps(treatment) if isinstance(treatment, dict) else treatment
+
+
+class Checkpoint:
+    """
+    JSON file with the last committed scan id and running totals, replaced
+    atomically after each chunk. A checkpoint written for another set of model
+    versions is ignored, so a new model always starts from the first scan.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.state = {"model_version": version, "last_id": 0, "counts": Counter(), "transitions": Counter()}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("model_version") == version:
+                self.state.update(saved)
+                self.state["counts"] = Counter(saved.get("counts", {}))
+                self.state["transitions"] = Counter(saved.get("transitions", {}))
+            else:
+                print(f"checkpoint {path} is for {saved.get('model_version')}, starting over")
+
+    @property
+    def resumed(self):
+        return self.state["last_id"] > 0
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _chunks(versions, last_id, chunk_size):
+    # keyset over id; rows already scored by one of the current models are skipped
+    db = SessionLocal()
+    try:
+        while True:
+            rows = (
+                db.query(Scan.id, Scan.timestamp, Scan.crop, Scan.top_label, Scan.confidence, Scan.image_path, Scan.image_base64)
+                .filter(Scan.id > last_id, or_(Scan.model_version.is_(None), Scan.model_version.notin_(versions)))
+                .order_by(Scan.id)
+                .limit(chunk_size)
+                .all()
+            )
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield rows
+    finally:
+        db.close()
+
+
+def _score(decoded, batch_size):
+    # decoded: list of uint8 images -> one routed top-1 result per image; one float32 buffer reused for every batch
+    buf = np.empty((min(batch_size, len(decoded)), IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    out = []
+    for start in range(0, len(decoded), batch_size):
+        part = decoded[start:start + batch_size]
+        batch = buf[:len(part)]
+        for i, img in enumerate(part):
+            np.multiply(img, _SCALE, out=batch[i])
+        out.extend(predict_routed(batch, top_k=1))
+    return out
+
+
+def _apply(rows, results, batch_size, dry_run, diff_writer, ckpt):
+    counts, transitions = ckpt.state["counts"], ckpt.state["transitions"]
+    ok = [(row, img) for row, img in zip(rows, results) if not isinstance(img, str)]
+    for row, err in zip(rows, results):
+        if isinstance(err, str):
+            counts["failed"] += 1
+            print(f"scan {row.id}: {err}")
+    if not ok:
+        return
+
+    scored = _score([img for _, img in ok], batch_size)
+    params, old, new = [], [], []
+    for (row, _), result in zip(ok, scored):
+        top = result["top_k"][0]
+        params.append({
+            "id": row.id, "top_label": top["label"], "confidence": top["confidence"], "crop": result["crop"],
+            "treatment": _treatment_text(top["treatment"]), "model_version": result["model_version"],
+        })
+        if top["label"] != row.top_label or result["crop"] != row.crop:
+            # stats counters move from the old label/crop to the new one
+            old.append(SimpleNamespace(timestamp=row.timestamp, crop=row.crop, top_label=row.top_label))
+            new.append(SimpleNamespace(timestamp=row.timestamp, crop=result["crop"], top_label=top["label"]))
+        if top["label"] != row.top_label:
+            counts["changed"] += 1
+            transitions[f"{row.top_label} -> {top['label']}"] += 1
+            diff_writer.writerow([row.id, row.timestamp.isoformat() if row.timestamp else "", row.top_label,
+                                  row.confidence, top["label"], round(top["confidence"], 6)])
+        else:
+            counts["unchanged"] += 1
+
+    if dry_run:
+        return
+    db = SessionLocal()
+    try:
+        # one bulk UPDATE by primary key, with the counter adjustments in the same transaction
+        db.execute(update(Scan), params)
+        if old:
+            record_scans(db, old, delta=-1)
+            record_scans(db, new, delta=1)
+        db.commit()
+    finally:
+        db.close()
+
+
+def rescore(chunk_size=512, batch_size=64, workers=RESCORE_WORKERS, checkpoint="rescore_checkpoint.json",
+            report="rescore_report", dry_run=False, prefetch=2):
+    """
+    Decoding runs on a process pool `prefetch` chunks ahead of inference, so
+    the model is kept busy while the next images are read and resized.
+    """
+    load_model()
+    versions = registry.versions()
+    # identifies this set of models for the checkpoint
+    version = registry.version_key()
+    ckpt = Checkpoint(None if dry_run else checkpoint, version)
+    if ckpt.resumed:
+        print(f"resuming after scan {ckpt.state['last_id']}")
+
+    t0 = time.perf_counter()
+    done = 0
+    csv_path = f"{report}.csv"
+    append = ckpt.resumed and os.path.exists(csv_path)
+    with open(csv_path, "a" if append else "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=max(1, workers), mp_context=mp.get_context("spawn")) as pool:
+        diff_writer = csv.writer(f)
+        if not append:
+            diff_writer.writerow(["id", "timestamp", "old_label", "old_confidence", "new_label", "new_confidence"])
+        pending = deque()
+        chunks = _chunks(list(versions.values()), ckpt.state["last_id"], chunk_size)
+        while True:
+            while len(pending) < prefetch:
+                rows = next(chunks, None)
+                if rows is None:
+                    break
+                tasks = [(r.image_path, r.image_base64) for r in rows]
+                pending.append((rows, pool.map(_decode, tasks, chunksize=max(1, len(tasks) // (4 * max(1, workers))))))
+            if not pending:
+                break
+            rows, results = pending.popleft()
+            _apply(rows, list(results), batch_size, dry_run, diff_writer, ckpt)
+            f.flush()
+            ckpt.state["last_id"] = rows[-1].id
+            ckpt.save()
+            done += len(rows)
+            rate = done / max(time.perf_counter() - t0, 1e-9)
+            print(f"{done} scans ({rate:.0f}/s), " + ", ".join(f"{k} {v}" for k, v in sorted(ckpt.state["counts"].items())))
+
+    summary = {
+        "model_version": version,
+        "models": versions,
+        "dry_run": dry_run,
+        "counts": dict(ckpt.state["counts"]),
+        "transitions": dict(ckpt.state["transitions"].most_common()),
+    }
+    with open(f"{report}.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Re-score stored scans with the current model")
+    ap.add_argument("--chunk-size", type=int, default=512, help="scans read, decoded and committed together")
+    ap.add_argument("--batch-size", type=int, default=64, help="images per model call")
+    ap.add_argument("--workers", type=int, default=RESCORE_WORKERS, help="decode processes")
+    ap.add_argument("--checkpoint", default="rescore_checkpoint.json")
+    ap.add_argument("--report", default="rescore_report", help="path prefix for the .csv and .json diff report")
+    ap.add_argument("--dry-run", action="store_true", help="write the diff report without updating scans")
+    args = ap.parse_args()
+
+    summary = rescore(args.chunk_size, args.batch_size, args.workers, args.checkpoint, args.report, args.dry_run)
+    print("done: " + ", ".join(f"{k} {v}" for k, v in sorted(summary["counts"].items())))
+    for transition, n in list(summary["transitions"].items())[:20]:
+        print(f"  {transition}: {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# backend/scan_writer.py
+import os
+import time
+import queue
+import hashlib
+import threading
+from collections import Counter
+from datetime import datetime
+
+from backend.db import SessionLocal
+from backend.crud import create_scan_records, collect_blob, scan_ids, store_image
+
+SCAN_QUEUE_SIZE = int(os.environ.get("SCAN_QUEUE_SIZE", "1000"))
+SCAN_FLUSH_BATCH = int(os.environ.get("SCAN_FLUSH_BATCH", "200"))
+SCAN_FLUSH_INTERVAL_MS = float(os.environ.get("SCAN_FLUSH_INTERVAL_MS", "50"))
+
+
+class ScanWriter:
+    """
+    Write-behind persistence for scans. submit() assigns the scan id up front,
+    stores the image blob and queues the record without the image bytes, so a
+    full queue holds metadata only; a background thread writes queued records
+    (row + stats) in batched transactions. submit() blocks when the queue is
+    full, which is the backpressure signal for callers.
+
+    Unreferenced blobs are removed by the same thread, between flushes
+    (release()), and never while a queued record still points at them.
+    """
+
+    def __init__(self, max_queue=SCAN_QUEUE_SIZE, batch_size=SCAN_FLUSH_BATCH, flush_interval_ms=SCAN_FLUSH_INTERVAL_MS):
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(0.0, float(flush_interval_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._stop = threading.Event()
+        self._released = queue.Queue()  # blob keys whose last row may have been deleted
+        self._pending_keys = Counter()  # blob key -> submitted records not yet flushed
+        self._keys_lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+            self._thread.start()
+
+    def _prepare(self, record):
+        record = dict(record)
+        if record.get("image_bytes") is not None:
+            data = record.pop("image_bytes")
+            key = record.pop("digest", None) or hashlib.sha256(data).hexdigest()
+            # pinned before the blob is (re)written, so a concurrent collect cannot remove it under us
+            self._pin(key)
+            try:
+                # content-addressed, so a retry after queue.Full rewrites nothing
+                record["image_path"] = store_image(data, key)
+            except Exception:
+                self._unpin([key])
+                raise
+            record["image_bytes"] = None
+        elif record.get("image_path"):
+            self._pin(record["image_path"])
+        record["scan_id"] = scan_ids.next()
+        record.setdefault("timestamp", datetime.utcnow())
+        return record
+
+    def _pin(self, key):
+        with self._keys_lock:
+            self._pending_keys[key] += 1
+
+    def _unpin(self, keys):
+        with self._keys_lock:
+            for key in keys:
+                self._pending_keys[key] -= 1
+                if self._pending_keys[key] <= 0:
+                    del self._pending_keys[key]
+
+    def submit(self, record, block=True, timeout=None):
+        # record: create_scan_record keyword arguments; returns the scan id the row will get.
+        # Writes the blob, so call it off the event loop.
+        # Raises queue.Full if the queue stays full past timeout (or at once with block=False).
+        record = self._prepare(record)
+        try:
+            self._queue.put(record, block=block, timeout=timeout)
+        except queue.Full:
+            if record.get("image_path"):
+                self._unpin([record["image_path"]])
+            raise
+        return record["scan_id"]
+
+    def release(self, key):
+        # a row using this blob was deleted; the writer removes the blob if nothing else uses it
+        self._released.put(key)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _take_batch(self):
+        try:
+            items = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _flush(self, items):
+        db = SessionLocal()
+        try:
+            create_scan_records(db, items)
+            self.written += len(items)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(items)
+            print(f"Scan writer: failed to store {len(items)} scans:", e)
+        finally:
+            db.close()
+            self._unpin([item["image_path"] for item in items if item.get("image_path")])
+
+    def _collect(self):
+        while True:
+            try:
+                key = self._released.get_nowait()
+            except queue.Empty:
+                return
+            db = SessionLocal()
+            try:
+                # held through the unlink: a submit() for the same image either pinned it
+                # already (and its row will reference it) or re-writes it afterwards
+                with self._keys_lock:
+                    if not self._pending_keys[key]:
+                        collect_blob(db, key)
+            except Exception as e:
+                print(f"Scan writer: failed to collect blob {key}:", e)
+            finally:
+                db.close()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            items = self._take_batch()
+            if items:
+                self._flush(items)
+            self._collect()
+        self._collect()
+
+    def stop(self, timeout=30):
+        # drains everything already queued before returning
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+
+scan_writer = ScanWriter()
@@ -0,0 +1,141 @@
+# backend/stats.py
+# Scan counters per label and crop, bucketed by hour, day and all-time.
+# Maintained incrementally by crud when scans are written or deleted;
+# rebuild_stats.py recomputes them from the scans table.
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, String, DateTime, Integer, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from backend.db import Base
+
+GRANULARITIES = ("hour", "day")
+ALL_TIME = datetime(1970, 1, 1)  # bucket used by the "all" granularity
+UNKNOWN = "unknown"
+DEFAULT_SERIES_SPAN = {"hour": timedelta(hours=48), "day": timedelta(days=30)}
+
+
+class ScanStat(Base):
+    __tablename__ = "scan_stats"
+
+    granularity = Column(String, primary_key=True)  # "hour" | "day" | "all"
+    bucket = Column(DateTime, primary_key=True)     # bucket start (UTC)
+    dimension = Column(String, primary_key=True)    # "label" | "crop"
+    key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def bucket_start(ts, granularity):
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ALL_TIME
+
+
+def bucket_end(ts, granularity):
+    # exclusive upper bound that keeps the bucket containing ts, unless ts is exactly its start
+    start = bucket_start(ts, granularity)
+    if start == ts:
+        return start
+    return start + (timedelta(hours=1) if granularity == "hour" else timedelta(days=1))
+
+
+def _add(counts, ts, crop, label, n):
+    for granularity in GRANULARITIES + ("all",):
+        bucket = bucket_start(ts, granularity)
+        counts[(granularity, bucket, "label", label or UNKNOWN)] += n
+        counts[(granularity, bucket, "crop", crop or UNKNOWN)] += n
+
+
+def _upsert(db: Session, counts):
+    for (granularity, bucket, dimension, key), n in counts.items():
+        if n == 0:
+            continue
+        stmt = sqlite_insert(ScanStat).values(granularity=granularity, bucket=bucket, dimension=dimension, key=key, count=n)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket", "dimension", "key"],
+            set_={"count": ScanStat.count + n},
+        )
+        db.execute(stmt)
+
+
+def record_scans(db: Session, scans, delta=1):
+    # scans: objects with timestamp, crop and top_label. Runs in the caller's
+    # transaction, so counters commit (or roll back) together with the rows.
+    counts = Counter()
+    for s in scans:
+        _add(counts, s.timestamp, s.crop, s.top_label, delta)
+    _upsert(db, counts)
+
+
+def query_stats(db: Session, since=None, until=None, granularity="day"):
+    """
+    Label and crop counts plus a per-bucket series. Work is proportional to the
+    number of buckets in range, not the number of scans. The range is widened
+    to whole buckets: since is rounded down to its bucket start and until
+    (exclusive) up to the next bucket boundary, so every bucket that overlaps
+    [since, until) is counted in full, in both the totals and the series.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+    until_bucket = bucket_end(until, granularity) if until is not None else None
+
+    totals = db.query(ScanStat.dimension, ScanStat.key, func.sum(ScanStat.count))
+    if since is None and until is None:
+        totals = totals.filter(ScanStat.granularity == "all")
+    else:
+        totals = totals.filter(ScanStat.granularity == granularity)
+        if since is not None:
+            totals = totals.filter(ScanStat.bucket >= bucket_start(since, granularity))
+        if until is not None:
+            totals = totals.filter(ScanStat.bucket < until_bucket)
+    labels, crops = {}, {}
+    for dimension, key, n in totals.group_by(ScanStat.dimension, ScanStat.key).all():
+        if n:
+            (labels if dimension == "label" else crops)[key] = int(n)
+
+    series_since = since if since is not None else (until or datetime.utcnow()) - DEFAULT_SERIES_SPAN[granularity]
+    series = (
+        db.query(ScanStat.bucket, func.sum(ScanStat.count))
+        .filter(ScanStat.granularity == granularity, ScanStat.dimension == "label")
+        .filter(ScanStat.bucket >= bucket_start(series_since, granularity))
+    )
+    if until is not None:
+        series = series.filter(ScanStat.bucket < until_bucket)
+    series = series.group_by(ScanStat.bucket).order_by(ScanStat.bucket).all()
+
+    return {
+        "counts": labels,
+        "crops": crops,
+        "total_scans": sum(labels.values()),
+        "granularity": granularity,
+        "series": [{"bucket": b.isoformat(), "count": int(n)} for b, n in series if n],
+    }
+
+
+def rebuild_stats(db: Session):
+    # one GROUP BY pass over scans at hour resolution; day and all-time roll up from it
+    from backend.crud import Scan
+
+    hour = func.strftime("%Y-%m-%d %H:00:00", Scan.timestamp)
+    rows = (
+        db.query(hour, Scan.crop, Scan.top_label, func.count(Scan.id))
+        .filter(Scan.timestamp.isnot(None))
+        .group_by(hour, Scan.crop, Scan.top_label)
+        .all()
+    )
+    counts = Counter()
+    for bucket, crop, label, n in rows:
+        _add(counts, datetime.strptime(bucket, "%Y-%m-%d %H:%M:%S"), crop, label, n)
+
+    db.query(ScanStat).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ScanStat, [
+        {"granularity": g, "bucket": b, "dimension": d, "key": k, "count": n}
+        for (g, b, d, k), n in counts.items()
+    ])
+    db.commit()
+    return len(counts)
+
@@ -0,0 +1,138 @@
+# backend/thumbnails.py
+import io
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+from backend import metrics
+from backend.blob_store import blob_store
+
+THUMB_DIR = os.environ.get("THUMB_DIR", os.path.join(os.path.dirname(__file__), "thumbnails"))
+# name -> longest edge in pixels; aspect ratio is kept
+THUMB_SIZES = {"sm": 128, "md": 256, "lg": 512}
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "75"))
+THUMB_WORKERS = int(os.environ.get("THUMB_WORKERS", "2"))
+# scheduled thumbnails waiting for a worker; past this new ones are skipped and made
+# on first request instead (or by python -m backend.backfill_thumbnails)
+THUMB_QUEUE_SIZE = int(os.environ.get("THUMB_QUEUE_SIZE", "1000"))
+# WEBP is about a third smaller than JPEG at this size; fall back if Pillow was built without it
+THUMB_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMB_MEDIA_TYPE = f"image/{THUMB_FORMAT.lower()}"
+THUMB_EXT = ".webp" if THUMB_FORMAT == "WEBP" else ".jpg"
+
+
+class ThumbnailStore:
+    """
+    Fixed-size thumbnails keyed by the source blob key (sha256 of the original),
+    stored at root/ab/<key>_<size>.webp. The key is content-addressed, so a
+    thumbnail never changes once written and can be cached forever downstream.
+    Ingest schedules generation on a small thread pool by blob key only (the
+    worker reads the original back from the blob store), with at most
+    max_pending waiting; a request for a thumbnail that is not there yet
+    generates it inline.
+    """
+
+    def __init__(self, root=THUMB_DIR, sizes=THUMB_SIZES, quality=THUMB_QUALITY, workers=THUMB_WORKERS, max_pending=THUMB_QUEUE_SIZE):
+        self.root = root
+        self.sizes = dict(sizes)
+        self.quality = quality
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self._pool = None
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self.generated = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnails")
+        return self._pool
+
+    def path(self, key, size):
+        return os.path.join(self.root, key[:2], f"{key}_{size}{THUMB_EXT}")
+
+    def exists(self, key):
+        return all(os.path.exists(self.path(key, size)) for size in self.sizes)
+
+    def etag(self, key, size):
+        return f'"{key}-{size}-{THUMB_FORMAT.lower()}"'
+
+    def generate(self, key, data):
+        # one decode for all sizes: draft straight to the largest, then shrink step by step
+        with metrics.timed("thumbnail"):
+            img = Image.open(io.BytesIO(data))
+            largest = max(self.sizes.values())
+            img.draft("RGB", (largest, largest))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            os.makedirs(os.path.join(self.root, key[:2]), exist_ok=True)
+            for size, edge in sorted(self.sizes.items(), key=lambda kv: -kv[1]):
+                img.thumbnail((edge, edge), Image.LANCZOS)
+                path = self.path(key, size)
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                img.save(tmp, THUMB_FORMAT, quality=self.quality, method=4 if THUMB_FORMAT == "WEBP" else 0)
+                os.replace(tmp, path)
+        with self._lock:
+            self.generated += 1
+
+    def _generate_once(self, key):
+        try:
+            if not self.exists(key) and blob_store.exists(key):
+                self.generate(key, blob_store.get(key))
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Thumbnails: could not generate {key}:", e)
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+    def schedule(self, key):
+        # fire and forget for a stored blob; duplicate uploads of one image are generated once.
+        # Returns False when the backlog is full and the thumbnail was left for later
+        with self._lock:
+            if key in self._inflight:
+                return True
+            if len(self._inflight) >= self.max_pending:
+                self.skipped += 1
+                return False
+            self._inflight.add(key)
+        self._get_pool().submit(self._generate_once, key)
+        return True
+
+    def get_path(self, key, size, load=None):
+        # load() returns the original bytes, called only when the thumbnail is missing
+        path = self.path(key, size)
+        if not os.path.exists(path):
+            data = load() if load else None
+            if not data:
+                return None
+            self.generate(key, data)
+        return path
+
+    def delete(self, key):
+        for size in self.sizes:
+            try:
+                os.remove(self.path(key, size))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {"generated": self.generated, "failed": self.failed, "skipped": self.skipped, "pending": len(self._inflight)}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+thumbnail_store = ThumbnailStore()
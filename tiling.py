@@ -0,0 +1,160 @@
+# backend/tiling.py
+# Tiled inference for large photos (whole plants, drone shots): the image is
+# decoded once, cut into overlapping IMG_SIZE tiles as strided views, and the
+# tiles go through the model in batches.
+import io
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image, ImageOps
+
+from backend import metrics
+from backend.model_registry import registry, GENERAL
+from backend.preprocess import IMG_SIZE, _SCALE
+from backend.predict import format_predictions
+
+# fraction of a tile shared with its neighbour
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.25"))
+# longest edge the image is decoded at; caps the tile count (2048x1536 -> 12x9 tiles)
+TILE_MAX_EDGE = int(os.environ.get("TILE_MAX_EDGE", "2048"))
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", "16"))
+
+
+def decode_for_tiles(image_bytes, max_edge=TILE_MAX_EDGE):
+    """
+    Decode to one (H, W, 3) float32 array in [0, 1] with the longest edge at most
+    max_edge. An edge shorter than IMG_SIZE is zero-padded up to it rather than
+    upscaled, so a long thin strip cannot blow the other edge past max_edge.
+    Returns (array, factor) where factor converts array pixels back to
+    original-image pixels.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    original_edge = max(img.size)
+    # JPEG: let libjpeg skip detail we would throw away anyway
+    img.draft("RGB", (max_edge, max_edge))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    w, h = img.size
+    scale = min(1.0, max_edge / max(w, h))
+    if scale != 1.0:
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR, reducing_gap=3.0)
+    arr = np.asarray(img, dtype=np.uint8)
+    h, w = arr.shape[:2]
+    out = np.zeros((max(h, IMG_SIZE), max(w, IMG_SIZE), 3), dtype=np.float32)
+    np.multiply(arr, _SCALE, out=out[:h, :w])
+    return out, original_edge / max(h, w)
+
+
+def _starts(length, tile, stride):
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] + tile < length:
+        starts.append(length - tile)  # last tile flush with the edge
+    return starts
+
+
+class TileGrid:
+    """
+    Overlapping tiles over a decoded image. `windows` is a sliding_window_view,
+    so no tile is copied until batch() gathers a run of them into one
+    contiguous model input.
+    """
+
+    def __init__(self, image, tile=IMG_SIZE, overlap=TILE_OVERLAP, factor=1.0):
+        self.image = image
+        self.tile_size = tile
+        self.factor = factor
+        self.stride = max(1, int(round(tile * (1 - min(max(overlap, 0.0), 0.9)))))
+        h, w = image.shape[:2]
+        self.ys = _starts(h, tile, self.stride)
+        self.xs = _starts(w, tile, self.stride)
+        # (H - tile + 1, W - tile + 1, tile, tile, 3) view of every possible tile
+        self.windows = sliding_window_view(image, (tile, tile, 3))[:, :, 0]
+        grid_y, grid_x = np.meshgrid(self.ys, self.xs, indexing="ij")
+        self.pos_y = grid_y.ravel()
+        self.pos_x = grid_x.ravel()
+
+    def __len__(self):
+        return len(self.pos_y)
+
+    def tile(self, k):
+        # k-th tile in row-major order, as a view into the image
+        return self.windows[self.pos_y[k], self.pos_x[k]]
+
+    def batch(self, start, stop):
+        # tiles [start, stop) in row-major order as one (n, tile, tile, 3) array
+        return self.windows[self.pos_y[start:stop], self.pos_x[start:stop]]
+
+    def ranges(self, batch_size=TILE_BATCH_SIZE):
+        for start in range(0, len(self), batch_size):
+            yield start, min(start + batch_size, len(self))
+
+
+def decode_grid(image_bytes, overlap=TILE_OVERLAP, max_edge=TILE_MAX_EDGE):
+    with metrics.timed("tile_decode"):
+        image, factor = decode_for_tiles(image_bytes, max_edge)
+        return TileGrid(image, overlap=overlap, factor=factor)
+
+
+def _disease_mask(labels):
+    return np.array(["healthy" not in label.lower() for label in labels])
+
+
+def confident(scores, stop_at, labels):
+    # True when any tile shows a disease class at or above stop_at
+    if stop_at is None:
+        return False
+    mask = _disease_mask(labels)
+    return bool((scores[:, mask] >= stop_at).any()) if mask.any() else False
+
+
+def combine(grid, scores, model, top_k=3, stopped=False):
+    """
+    scores: (n, num_classes) for the first n tiles. Each class gets the score of
+    its strongest tile, so one small lesion is not averaged away by healthy
+    leaf; coverage is the share of evaluated tiles where it wins. model is the
+    model_registry.LoadedModel that produced scores.
+    """
+    n = len(scores)
+    image_scores = scores.max(axis=0)
+    result = format_predictions(image_scores, top_k=top_k, model=model)
+    winners = scores.argmax(axis=1)
+    counts = np.bincount(winners, minlength=scores.shape[1])
+    for p, idx in zip(result["top_k"], np.argsort(image_scores)[::-1][:top_k]):
+        p["tiles"] = int(counts[idx])
+        p["coverage"] = round(float(counts[idx]) / n, 4)
+
+    cols = len(grid.xs)
+    cells = [[None] * cols for _ in grid.ys]
+    best = scores[np.arange(n), winners]
+    for k in range(n):
+        r, c = divmod(k, cols)
+        cells[r][c] = {"label": model.labels[winners[k]], "confidence": round(float(best[k]), 4)}
+    result["tile_map"] = {
+        "rows": len(grid.ys),
+        "cols": cols,
+        # tile geometry in original-image pixels
+        "tile_px": round(grid.tile_size * grid.factor),
+        "ys": [round(y * grid.factor) for y in grid.ys],
+        "xs": [round(x * grid.factor) for x in grid.xs],
+        "cells": cells,
+    }
+    result["tiles_evaluated"] = n
+    result["tiles_total"] = len(grid)
+    result["early_stopped"] = stopped
+    return result
+
+
+def tiled_predict(image_bytes, top_k=3, overlap=TILE_OVERLAP, max_edge=TILE_MAX_EDGE,
+                  batch_size=TILE_BATCH_SIZE, stop_at=None):
+    # blocking version for scripts; the API runs the same steps through the batcher
+    model = registry.get(GENERAL)
+    grid = decode_grid(image_bytes, overlap, max_edge)
+    parts = []
+    stopped = False
+    for start, stop in grid.ranges(batch_size):
+        scores = np.asarray(model.predict(grid.batch(start, stop)), dtype=np.float32)
+        parts.append(scores)
+        if confident(scores, stop_at, model.labels) and stop < len(grid):
+            stopped = True
+            break
+    return combine(grid, np.concatenate(parts), model, top_k=top_k, stopped=stopped)
@@ -0,0 +1,136 @@
+# backend/tts_cache.py
+import os
+import hashlib
+import threading
+from concurrent.futures import Future
+
+TTS_CACHE_DIR = os.environ.get("TTS_CACHE_DIR", os.path.join(os.path.dirname(__file__), "tts_files"))
+TTS_CACHE_BYTES = int(os.environ.get("TTS_CACHE_BYTES", str(256 * 1024 * 1024)))
+# "gtts" calls Google TTS; "local" writes silent audio, for tests and benchmarks
+TTS_ENGINE = os.environ.get("TTS_ENGINE", "gtts")
+TTS_LANGUAGES = [l.strip() for l in os.environ.get("TTS_LANGUAGES", "en,hi").split(",") if l.strip()]
+
+
+def gtts_synthesize(text, lang, path):
+    from gtts import gTTS
+    gTTS(text=text, lang=lang).save(path)
+
+
+# one silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz, ~26 ms)
+_SILENT_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+
+def local_synthesize(text, lang, path):
+    # stand-in synthesizer: roughly 60 ms of silence per character, no network
+    with open(path, "wb") as f:
+        f.write(_SILENT_FRAME * max(1, len(text) * 2))
+
+
+SYNTHESIZERS = {"gtts": gtts_synthesize, "local": local_synthesize}
+
+
+class TTSCache:
+    """
+    Disk cache of synthesized speech keyed on sha256(lang, text). Files are
+    touched on every hit and the least recently used ones are removed once the
+    directory grows past max_bytes. Concurrent requests for the same text wait
+    on a single synthesis.
+    """
+
+    def __init__(self, root=TTS_CACHE_DIR, max_bytes=TTS_CACHE_BYTES, synthesize=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize or SYNTHESIZERS[TTS_ENGINE]
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future resolving to the file path
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(os.path.getsize(p) for p in self._files())
+
+    @staticmethod
+    def key(text, lang):
+        return hashlib.sha256(f"{lang}\0{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.mp3")
+
+    def _files(self):
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".mp3"):
+                    yield os.path.join(dirpath, name)
+
+    def get_path(self, text, lang):
+        # returns the path of the cached audio, synthesizing it on first use
+        key = self.key(text, lang)
+        path = self.path(key)
+        if os.path.exists(path):
+            try:
+                os.utime(path)  # mtime doubles as the LRU clock
+            except FileNotFoundError:
+                pass
+            else:
+                with self._lock:
+                    self.hits += 1
+                return path
+
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+                self.misses += 1
+        if not owner:
+            return fut.result()
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                self.synthesize(text, lang, tmp)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            with self._lock:
+                self._size += os.path.getsize(path)
+            self._evict(keep=path)
+            fut.set_result(path)
+            return path
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _evict(self, keep=None):
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return
+            files = []
+            for p in self._files():
+                try:
+                    st = os.stat(p)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+            self._size = sum(size for _, size, _ in files)
+            for _, size, p in sorted(files):
+                if self._size <= self.max_bytes:
+                    break
+                if p == keep:
+                    continue
+                try:
+                    os.remove(p)
+                    self._size -= size
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {"bytes": self._size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+tts_cache = TTSCache()
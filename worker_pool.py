@@ -0,0 +1,246 @@
+# backend/worker_pool.py
+import os
+import queue
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backend.model_loader import INFERENCE_WORKERS, load_labels
+from backend.preprocess import IMG_SIZE
+
+WORKER_MAX_BATCH = int(os.environ.get("WORKER_MAX_BATCH", os.environ.get("BATCH_MAX_SIZE", "8")))
+WORKER_START_TIMEOUT = float(os.environ.get("WORKER_START_TIMEOUT", "300"))
+WORKER_CHECK_INTERVAL = 2.0
+
+IMG_SHAPE = (IMG_SIZE, IMG_SIZE, 3)
+
+# set by start_pool(); predict.predict_batch routes through it when present
+pool = None
+
+
+def _worker_main(in_name, out_name, max_batch, num_classes, conn):
+    # runs in a spawned child: only the model is loaded here, not the web app
+    from backend.model_loader import load_model
+
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    x = np.ndarray((max_batch,) + IMG_SHAPE, dtype=np.float32, buffer=shm_in.buf)
+    y = np.ndarray((max_batch, num_classes), dtype=np.float32, buffer=shm_out.buf)
+    try:
+        model = load_model()
+        conn.send(("ready", None))
+    except Exception as e:
+        conn.send(("error", f"model load failed: {e}"))
+        return
+
+    # only the batch size crosses the pipe; tensors stay in shared memory
+    while True:
+        try:
+            n = conn.recv()
+        except EOFError:
+            break
+        if n is None:
+            break
+        try:
+            y[:n] = model.predict(x[:n])
+            conn.send(("ok", n))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+    del x, y
+    shm_in.close()
+    shm_out.close()
+
+
+class _Worker:
+    def __init__(self, idx, max_batch, num_classes):
+        self.idx = idx
+        self.max_batch = max_batch
+        self.num_classes = num_classes
+        self.lock = threading.Lock()
+        self.shm_in = shared_memory.SharedMemory(create=True, size=max_batch * int(np.prod(IMG_SHAPE)) * 4)
+        self.shm_out = shared_memory.SharedMemory(create=True, size=max_batch * num_classes * 4)
+        self.x = np.ndarray((max_batch,) + IMG_SHAPE, dtype=np.float32, buffer=self.shm_in.buf)
+        self.y = np.ndarray((max_batch, num_classes), dtype=np.float32, buffer=self.shm_out.buf)
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.restarts = 0
+        self.warm_sizes = ()  # batch sizes warm_up() ran; replayed in a respawned process
+
+    def spawn(self, ctx):
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(self.shm_in.name, self.shm_out.name, self.max_batch, self.num_classes, child_conn),
+            name=f"inference-worker-{self.idx}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = False
+
+    def kill(self):
+        if self.conn is not None:
+            self.conn.close()
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+
+    def restart(self, ctx):
+        self.kill()
+        self.restarts += 1
+        self.spawn(ctx)
+
+    def _wait_ready(self):
+        if not self.conn.poll(WORKER_START_TIMEOUT):
+            raise RuntimeError(f"Inference worker {self.idx} did not start in {WORKER_START_TIMEOUT}s")
+        status, payload = self.conn.recv()
+        if status != "ready":
+            raise RuntimeError(payload)
+        self.ready = True
+        if self.restarts and self.warm_sizes:
+            # a respawned process has traced nothing yet
+            self.warm_up(self.warm_sizes)
+
+    def warm_up(self, batch_sizes):
+        for n in batch_sizes:
+            self.run(np.zeros((min(n, self.max_batch),) + IMG_SHAPE, dtype=np.float32))
+        self.warm_sizes = tuple(batch_sizes)
+
+    def run(self, batch):
+        if not self.ready:
+            self._wait_ready()
+        n = len(batch)
+        self.x[:n] = batch
+        self.conn.send(n)
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {self.idx} failed: {payload}")
+        return self.y[:n].copy()
+
+    def close(self):
+        if self.conn is not None and self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            self.process.join(timeout=5)
+        self.kill()
+        del self.x, self.y
+        for shm in (self.shm_in, self.shm_out):
+            shm.close()
+            shm.unlink()
+
+
+class InferencePool:
+    """
+    N worker processes, each holding its own copy of the model. Every worker owns
+    a pair of shared-memory blocks for its input batch and output scores, so only
+    a batch size goes over the pipe. Dead workers are respawned by a monitor thread
+    (or by the caller that saw them die).
+    """
+
+    def __init__(self, num_workers=INFERENCE_WORKERS, max_batch_size=WORKER_MAX_BATCH, num_classes=None):
+        if num_classes is None:
+            num_classes = len(load_labels())
+        if not num_classes:
+            raise RuntimeError("Cannot size worker output buffers: labels.txt is empty or missing")
+        self.num_workers = max(1, int(num_workers))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._ctx = mp.get_context("spawn")  # never fork a process that may hold TF state
+        self._idle = queue.Queue()
+        self._workers = []
+        self._stopped = threading.Event()
+        for i in range(self.num_workers):
+            w = _Worker(i, self.max_batch_size, num_classes)
+            w.spawn(self._ctx)
+            self._workers.append(w)
+            self._idle.put(w)
+        self._monitor = threading.Thread(target=self._watch, name="inference-pool-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self):
+        while not self._stopped.wait(WORKER_CHECK_INTERVAL):
+            for w in self._workers:
+                # busy workers are handled by the caller that is using them
+                if not w.lock.acquire(blocking=False):
+                    continue
+                try:
+                    if not self._stopped.is_set() and not w.process.is_alive():
+                        print(f"Inference worker {w.idx} exited with code {w.process.exitcode}; restarting")
+                        w.restart(self._ctx)
+                        # load and warm up here rather than in the next request
+                        w._wait_ready()
+                except Exception as e:
+                    print(f"Inference worker {w.idx} failed to restart:", e)
+                finally:
+                    w.lock.release()
+
+    def _run_on_worker(self, batch, retries=1):
+        w = self._idle.get()
+        try:
+            with w.lock:
+                try:
+                    return w.run(batch)
+                except (EOFError, OSError) as e:
+                    w.restart(self._ctx)
+                    error = RuntimeError(f"Inference worker {w.idx} died: {e!r}")
+        finally:
+            self._idle.put(w)
+        if not retries:
+            raise error
+        # the batch itself is fine as far as we know: give it to the next idle worker
+        # (possibly the respawned one) before failing every caller waiting on it
+        print(f"{error}; retrying the batch")
+        return self._run_on_worker(batch, retries - 1)
+
+    def predict(self, batch):
+        # blocking; safe to call from several threads at once (one batch per idle worker)
+        if self._stopped.is_set():
+            raise RuntimeError("Inference pool is stopped")
+        batch = np.asarray(batch, dtype=np.float32)
+        if len(batch) <= self.max_batch_size:
+            return self._run_on_worker(batch)
+        parts = [self._run_on_worker(batch[i:i + self.max_batch_size]) for i in range(0, len(batch), self.max_batch_size)]
+        return np.concatenate(parts)
+
+    def wait_ready(self):
+        # blocks until every worker has loaded its model
+        for w in self._workers:
+            with w.lock:
+                if not w.ready:
+                    w._wait_ready()
+
+    def warm_up(self, batch_sizes):
+        # run dummy batches on every worker so each one has traced its graphs
+        for w in self._workers:
+            with w.lock:
+                w.warm_up(batch_sizes)
+
+    def stats(self):
+        return [{"worker": w.idx, "pid": w.process.pid, "alive": w.process.is_alive(), "ready": w.ready, "restarts": w.restarts} for w in self._workers]
+
+    def close(self):
+        self._stopped.set()
+        self._monitor.join(timeout=WORKER_CHECK_INTERVAL * 2)
+        for w in self._workers:
+            with w.lock:
+                w.close()
+
+
+def start_pool(num_workers=INFERENCE_WORKERS, **kwargs):
+    global pool
+    if pool is None and num_workers > 0:
+        pool = InferencePool(num_workers, **kwargs)
+    return pool
+
+
+def stop_pool():
+    global pool
+    if pool is not None:
+        pool.close()
+        pool = None